@@ -1,5 +1,69 @@
 import json
-from typing import List, Dict, Any
+import sys
+from collections import Counter
+from typing import List, Dict, Any, Iterable
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the standard library encoder
+    orjson = None
+
+SEPARATOR = "=" * 80
+# Rules that open and close each dialogue in the text export
+HEADER_RULE = SEPARATOR + "\n\n"
+FOOTER_RULE = "\n" + SEPARATOR + "\n\n"
+# User speaker tag, and the line prefix of the OVERALL score row that ends a dialogue
+USER = sys.intern("USER")
+OVERALL_MARKER = USER + "\tOVERALL\t"
+# Input is read in large chunks and split into lines by the io layer
+READ_BUFFER_SIZE = 1 << 20
+
+
+def _json_dumps(obj, pretty: bool = True) -> bytes:
+    """Serialize to UTF-8 JSON bytes (2-space indent, or compact), using orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+class _JsonStreamWriter:
+    """Write {**header, key: [*items]} to a binary file one item at a time, laid out as a single dump."""
+    
+    def __init__(self, f, header: Dict, key: str, pretty: bool = True):
+        self.f = f
+        self.pretty = pretty
+        self.empty = True
+        # Line break plus indentation for header entries (depth 1) and list items (depth 2)
+        self.entry_nl = b"\n  " if pretty else b""
+        self.item_nl = b"\n    " if pretty else b""
+        colon = b": " if pretty else b":"
+        
+        f.write(b"{" + self.entry_nl)
+        for name, value in header.items():
+            f.write(self._dumps(name, self.entry_nl) + colon + self._dumps(value, self.entry_nl) + b"," + self.entry_nl)
+        f.write(self._dumps(key, self.entry_nl) + colon + b"[")
+    
+    def _dumps(self, obj, nl: bytes) -> bytes:
+        data = _json_dumps(obj, self.pretty)
+        return data.replace(b"\n", nl) if self.pretty else data
+    
+    def write(self, item: Dict):
+        """Append one item to the list."""
+        if not self.empty:
+            self.f.write(b",")
+        self.f.write(self.item_nl + self._dumps(item, self.item_nl))
+        self.empty = False
+    
+    def close(self):
+        """Close the list and the enclosing object (the file itself stays open)."""
+        if self.pretty and not self.empty:
+            self.f.write(b"\n  ]\n}")
+        elif self.pretty:
+            self.f.write(b"]\n}")
+        else:
+            self.f.write(b"]}")
 
 
 class DialogueConverter:
@@ -10,81 +74,113 @@ class DialogueConverter:
         self.current_dialogue = []
     
     def parse_line(self, line: str) -> Dict[str, Any]:
-        """Parse a single tab-separated line."""
-        parts = line.strip().split('\t')
+        """Parse a single tab-separated line.
+        
+        Missing scores are stored as None (never an empty list), so callers test them with `is not None`.
+        """
+        # Scores are always the last column, so stop splitting after the third tab
+        parts = line.rstrip().split('\t', 3)
         
         if len(parts) < 3:
             return None
         
-        speaker = parts[0].strip()
+        # Speakers, intents and score strings come from a tiny vocabulary (2, ~16
+        # and ~165 values on CCPE); intern them so every turn shares one string
+        # object and equality checks hit the identity fast path
+        speaker = sys.intern(parts[0].strip())
         text = parts[1].strip()
-        intent = parts[2].strip()
-        scores = parts[3].strip() if len(parts) > 3 else ""
-        
-        # Parse scores
-        score_list = []
-        if scores:
-            score_list = [int(s.strip()) for s in scores.split(',') if s.strip()]
+        intent = sys.intern(parts[2].strip())
+        score_list = self._parse_scores(parts[3]) if len(parts) > 3 else []
         
         return {
             "speaker": speaker,
             "text": text,
             "intent": intent,
-            "scores": score_list if score_list else None
+            "scores": score_list if score_list else None,
+            "scores_str": sys.intern(','.join(map(str, score_list)))
         }
     
+    def _parse_scores(self, scores: str) -> List[int]:
+        """Parse a comma-separated score column into a list of ints."""
+        # int() tolerates surrounding whitespace, so only blank tokens are skipped
+        return list(map(int, filter(str.strip, scores.split(','))))
+    
     def read_from_file(self, filename: str):
         """Read dialogue data from a file."""
-        with open(filename, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        self._process_lines(lines)
+        with open(filename, 'r', encoding='utf-8', buffering=READ_BUFFER_SIZE) as f:
+            self._process_lines(f)
     
     def read_from_text(self, text: str):
         """Read dialogue data from a string."""
         lines = text.strip().split('\n')
         self._process_lines(lines)
     
-    def _process_lines(self, lines: List[str]):
-        """Process lines and split into dialogues."""
+    def _process_lines(self, lines: Iterable[str]):
+        """Process lines (any iterable, e.g. an open file) and split into dialogues."""
+        # Bind the per-line methods once; the loop runs for every line of the corpus
+        parse_line = self.parse_line
+        parse_scores = self._parse_scores
+        end_dialogue = self._end_dialogue
+        
         for line in lines:
             if not line.strip():
                 continue
             
-            parsed = self.parse_line(line)
+            # Fast path for the OVERALL marker (end of dialogue): only its
+            # scores column is needed, so no turn dict is built for it
+            if line.startswith(OVERALL_MARKER):
+                parts = line.rstrip().split('\t', 3)
+                overall_scores = parse_scores(parts[3]) if len(parts) > 3 else []
+                end_dialogue(overall_scores or None)
+                continue
+            
+            parsed = parse_line(line)
             if not parsed:
                 continue
             
-            # Check if this is the OVERALL marker (end of dialogue)
-            if parsed["speaker"] == "USER" and parsed["text"] == "OVERALL":
-                if self.current_dialogue:
-                    self.dialogues.append({
-                        "turns": self.current_dialogue,
-                        "overall_scores": parsed["scores"]
-                    })
-                    self.current_dialogue = []
+            # Padded markers (e.g. "USER   \tOVERALL   \t...") miss the fast path
+            if parsed["speaker"] == USER and parsed["text"] == "OVERALL":
+                end_dialogue(parsed["scores"])
             else:
                 self.current_dialogue.append(parsed)
         
         # Add the last dialogue if exists and no OVERALL was found
+        self._end_dialogue(None)
+    
+    def _end_dialogue(self, overall_scores):
+        """Close the dialogue being collected, if any."""
         if self.current_dialogue:
-            self.dialogues.append({
-                "turns": self.current_dialogue,
-                "overall_scores": None
-            })
+            self._add_dialogue(self.current_dialogue, overall_scores)
+            self.current_dialogue = []
+    
+    def _add_dialogue(self, turns: List[Dict], overall_scores):
+        """Store a finished dialogue with its averages computed once for all writers."""
+        dialogue = {
+            "turns": turns,
+            "overall_scores": overall_scores,
+            "overall_scores_str": ','.join(map(str, overall_scores)) if overall_scores is not None else ""
+        }
+        avg_score = self.calculate_dialogue_average(dialogue)
+        dialogue["average_score"] = avg_score
+        # Exported values (2 decimals) are rounded once here so writers do no arithmetic
+        dialogue["average_score_rounded"] = round(avg_score, 2)
+        dialogue["average_score_100"] = round(self.scale_score(avg_score), 2) if avg_score > 0 else None
+        self.dialogues.append(dialogue)
     
     def calculate_dialogue_average(self, dialogue: Dict) -> float:
         """Calculate average score for a dialogue (using overall_scores if available)."""
-        if dialogue["overall_scores"]:
+        if dialogue["overall_scores"] is not None:
             return sum(dialogue["overall_scores"]) / len(dialogue["overall_scores"])
         
         # Fallback: average all turn scores if no overall scores
-        all_scores = []
+        total = 0
+        count = 0
         for turn in dialogue["turns"]:
-            if turn["scores"]:
-                all_scores.extend(turn["scores"])
+            if turn["scores"] is not None:
+                total += sum(turn["scores"])
+                count += len(turn["scores"])
         
-        return sum(all_scores) / len(all_scores) if all_scores else 0.0
+        return total / count if count else 0.0
     
     def scale_score(self, score, old_min=1, old_max=5, new_min=1, new_max=100):
         # To prevent division by zero, if the old range is a single number,
@@ -101,126 +197,121 @@ class DialogueConverter:
     
     def to_text_format(self, output_file: str):
         """Convert to text format with DIALOGUE 1, DIALOGUE 2, etc."""
-        with open(output_file, 'w', encoding='utf-8') as f:
+        with open(output_file, 'wb') as f:
             for idx, dialogue in enumerate(self.dialogues, 1):
-                avg_score = self.calculate_dialogue_average(dialogue)
+                avg_score = dialogue["average_score"]
                 
-                f.write(f"DIALOGUE {idx} (Average Score: {avg_score:.2f})\n")
-                f.write("=" * 80 + "\n\n")
+                # Collect the whole dialogue, encode it once and write it in one call
+                parts = [f"DIALOGUE {idx} (Average Score: {avg_score:.2f})\n", HEADER_RULE]
                 
                 for turn in dialogue["turns"]:
-                    f.write(f"{turn['speaker']}: {turn['text']}\n")
-                    if turn['scores']:
-                        f.write(f"[Intent: {turn['intent']} | Scores: {','.join(map(str, turn['scores']))}]\n")
+                    parts.append(f"{turn['speaker']}: {turn['text']}\n")
+                    if turn['scores'] is not None:
+                        parts.append(f"[Intent: {turn['intent']} | Scores: {turn['scores_str']}]\n\n")
                     else:
-                        f.write(f"[Intent: {turn['intent']}]\n")
-                    f.write("\n")
+                        parts.append(f"[Intent: {turn['intent']}]\n\n")
                 
-                if dialogue["overall_scores"]:
-                    f.write(f"OVERALL SCORES: {','.join(map(str, dialogue['overall_scores']))} (Average: {avg_score:.2f})\n")
+                if dialogue["overall_scores"] is not None:
+                    parts.append(f"OVERALL SCORES: {dialogue['overall_scores_str']} (Average: {avg_score:.2f})\n")
                 
-                f.write("\n" + "=" * 80 + "\n\n")
+                parts.append(FOOTER_RULE)
+                f.write("".join(parts).encode('utf-8'))
         
         print(f"✓ Text format saved to {output_file}")
         print(f"  Total dialogues: {len(self.dialogues)}")
     
-    def to_json_format(self, output_file: str, pretty: bool = True):
-        """Convert to JSON format."""
-        json_data = {
-            "total_dialogues": len(self.dialogues),
-            "dialogues": []
-        }
-        
-        for idx, dialogue in enumerate(self.dialogues, 1):
-            avg_score = self.calculate_dialogue_average(dialogue)
-            
-            dialogue_data = {
-                "dialogue_id": idx,
-                "turns": [],
-                "overall_scores": dialogue["overall_scores"],
-                "average_score": round(avg_score, 2),
-                "average_score_100": round(self.scale_score(avg_score), 2) if avg_score > 0 else None     
-                
-            }
-            
-            turn_id = 1
-            for turn in dialogue["turns"]:
-                turn_data = {
+    def _dialogue_to_json(self, idx: int, dialogue: Dict) -> Dict:
+        """Build the JSON-format record for one dialogue."""
+        return {
+            "dialogue_id": idx,
+            "turns": [
+                {
                     "turn_id": turn_id,
                     "speaker": turn["speaker"],
                     "text": turn["text"],
                     "intent": turn["intent"],
                     "scores": turn["scores"]
                 }
-                dialogue_data["turns"].append(turn_data)
-                turn_id += 1
-            
-            json_data["dialogues"].append(dialogue_data)
+                for turn_id, turn in enumerate(dialogue["turns"], 1)
+            ],
+            "overall_scores": dialogue["overall_scores"],
+            "average_score": dialogue["average_score_rounded"],
+            "average_score_100": dialogue["average_score_100"]
+        }
+    
+    def _dialogue_to_chat(self, idx: int, dialogue: Dict) -> Dict:
+        """Build the chat-format record for one dialogue."""
+        return {
+            "conversation_id": idx,
+            "messages": [self._turn_to_message(turn) for turn in dialogue["turns"]],
+            "overall_scores": dialogue["overall_scores"],
+            "average_score": dialogue["average_score_rounded"],
+            "average_score_100": dialogue["average_score_100"]
+        }
+    
+    def _turn_to_message(self, turn: Dict) -> Dict:
+        """Build the chat message (role: user/assistant) for one turn."""
+        role = "user" if turn["speaker"] == USER else "assistant"
+        message = {
+            "role": role,
+            "content": turn["text"]
+        }
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            if pretty:
-                json.dump(json_data, f, indent=2, ensure_ascii=False)
-            else:
-                json.dump(json_data, f, ensure_ascii=False)
+        # Add metadata if present
+        if turn["intent"] != "OTHER" or turn["scores"] is not None:
+            message["metadata"] = {
+                "intent": turn["intent"],
+                "scores": turn["scores"]
+            }
+        
+        return message
+    
+    def to_json_format(self, output_file: str, pretty: bool = True):
+        """Convert to JSON format."""
+        with open(output_file, 'wb') as f:
+            writer = _JsonStreamWriter(f, {"total_dialogues": len(self.dialogues)}, "dialogues", pretty)
+            for idx, dialogue in enumerate(self.dialogues, 1):
+                writer.write(self._dialogue_to_json(idx, dialogue))
+            writer.close()
         
         print(f"✓ JSON format saved to {output_file}")
         print(f"  Total dialogues: {len(self.dialogues)}")
     
     def to_chat_format_json(self, output_file: str):
         """Convert to chat-style JSON format (role: user/assistant)."""
-        json_data = {"conversations": []}
-        
-        for idx, dialogue in enumerate(self.dialogues, 1):
-            avg_score = self.calculate_dialogue_average(dialogue)
-            
-            conversation = {
-                "conversation_id": idx,
-                "messages": [],
-                "overall_scores": dialogue["overall_scores"],
-                "average_score": round(avg_score, 2),
-                "average_score_100": round(self.scale_score(avg_score), 2) if avg_score > 0 else None   
-            }
-            
-            for turn in dialogue["turns"]:
-                role = "user" if turn["speaker"] == "USER" else "assistant"
-                message = {
-                    "role": role,
-                    "content": turn["text"]
-                }
-                
-                # Add metadata if present
-                if turn["intent"] != "OTHER" or turn["scores"]:
-                    message["metadata"] = {
-                        "intent": turn["intent"],
-                        "scores": turn["scores"]
-                    }
-                
-                conversation["messages"].append(message)
-            
-            json_data["conversations"].append(conversation)
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(json_data, f, indent=2, ensure_ascii=False)
+        with open(output_file, 'wb') as f:
+            writer = _JsonStreamWriter(f, {}, "conversations")
+            for idx, dialogue in enumerate(self.dialogues, 1):
+                writer.write(self._dialogue_to_chat(idx, dialogue))
+            writer.close()
         
         print(f"✓ Chat format JSON saved to {output_file}")
         print(f"  Total conversations: {len(self.dialogues)}")
     
+    def export_all(self, json_file: str, chat_file: str, pretty: bool = True):
+        """Write the JSON and chat-style JSON formats in a single pass over the dialogues."""
+        with open(json_file, 'wb') as json_f, open(chat_file, 'wb') as chat_f:
+            json_writer = _JsonStreamWriter(json_f, {"total_dialogues": len(self.dialogues)}, "dialogues", pretty)
+            chat_writer = _JsonStreamWriter(chat_f, {}, "conversations")
+            for idx, dialogue in enumerate(self.dialogues, 1):
+                json_writer.write(self._dialogue_to_json(idx, dialogue))
+                chat_writer.write(self._dialogue_to_chat(idx, dialogue))
+            json_writer.close()
+            chat_writer.close()
+        
+        print(f"✓ JSON format saved to {json_file}")
+        print(f"✓ Chat format JSON saved to {chat_file}")
+        print(f"  Total dialogues: {len(self.dialogues)}")
+    
     def get_statistics(self):
         """Get statistics about the dialogues."""
-        total_turns = sum(len(d["turns"]) for d in self.dialogues)
+        # Every turn has exactly one intent, so one counting pass also gives the turn total
+        intent_counts = Counter(turn["intent"] for dialogue in self.dialogues for turn in dialogue["turns"])
+        total_turns = sum(intent_counts.values())
         avg_turns = total_turns / len(self.dialogues) if self.dialogues else 0
         
-        intent_counts = {}
-        for dialogue in self.dialogues:
-            for turn in dialogue["turns"]:
-                intent = turn["intent"]
-                intent_counts[intent] = intent_counts.get(intent, 0) + 1
-        
-        # Calculate average scores for all dialogues
-        dialogue_scores = []
-        for dialogue in self.dialogues:
-            avg_score = self.calculate_dialogue_average(dialogue)
-            dialogue_scores.append(avg_score)
+        # Average scores are cached per dialogue when it is parsed
+        dialogue_scores = [dialogue["average_score"] for dialogue in self.dialogues]
         
         overall_avg = sum(dialogue_scores) / len(dialogue_scores) if dialogue_scores else 0
         
@@ -228,7 +319,7 @@ class DialogueConverter:
             "total_dialogues": len(self.dialogues),
             "total_turns": total_turns,
             "average_turns_per_dialogue": round(avg_turns, 2),
-            "intent_distribution": intent_counts,
+            "intent_distribution": dict(intent_counts),
             "dialogue_average_scores": dialogue_scores,
             "overall_average_score": round(overall_avg, 2),
             "overall_average_score_100": round(self.scale_score(overall_avg), 2) if overall_avg > 0 else None
@@ -268,8 +359,7 @@ if __name__ == "__main__":
     
     # Convert to different formats
     converter.to_text_format(f'{output_path}/dialogues_output.txt')
-    converter.to_json_format(f'{output_path}/dialogues_output.json')
-    converter.to_chat_format_json(f'{output_path}/dialogues_chat_format.json')
+    converter.export_all(f'{output_path}/dialogues_output.json', f'{output_path}/dialogues_chat_format.json')
 
     print("\n✓ All conversions completed successfully!")
     print("\nGenerated files:")
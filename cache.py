@@ -0,0 +1,114 @@
+import functools
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# Cosine similarity above which two dialogues are treated as the same
+SIMILARITY_THRESHOLD = 0.9
+
+
+@functools.lru_cache(maxsize=None)
+def _semantic_backend() -> Optional[Tuple[Any, Any]]:
+    """(faiss, SentenceTransformer), imported when a semantic cache is created; None if either is missing."""
+    try:
+        import faiss
+        from sentence_transformers import SentenceTransformer
+    except ImportError:  # optional: only ResponseCache(semantic=True) needs them
+        return None
+    return faiss, SentenceTransformer
+
+
+def dialogue_key(dialogue_text: str) -> str:
+    """Digest of the dialogue with whitespace runs collapsed, so re-spaced copies still match."""
+    normalized = " ".join(dialogue_text.split())
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """LLM results per dialogue: exact hits by digest, and near-duplicates by embedding if asked for.
+
+    The semantic tier is off by default: it hands one dialogue's result to a
+    different dialogue whose embedding is merely close, and CCPE transcripts
+    share most of their wording. Enable it with `semantic=True` only where
+    that is acceptable (needs faiss and sentence-transformers).
+
+    With `path`, exact-tier entries are also appended to a JSONL log and
+    replayed on construction, so results survive across runs and processes;
+    results must then be JSON-serializable (e.g. response text or a score).
+    """
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD, path: Optional[str] = None,
+                 semantic: bool = False):
+        if semantic and _semantic_backend() is None:
+            raise ImportError("ResponseCache(semantic=True) needs faiss and sentence-transformers")
+        self.threshold = threshold
+        self.semantic = semantic
+        self.exact: Dict[str, Any] = {}
+        self.path = path
+        if path is not None and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.exact[entry["key"]] = entry["result"]
+        # Semantic tier (semantic=True only): index row i -> results[i]
+        self.results: List[Any] = []
+        self.index = None
+        self.model = None
+
+    def _embed(self, dialogue_text: str):
+        if self.model is None:
+            self.model = _semantic_backend()[1](EMBEDDING_MODEL)
+        return self.model.encode([dialogue_text], normalize_embeddings=True).astype('float32')
+
+    def lookup(self, dialogue_text: str) -> Optional[Any]:
+        """Return the stored result for this dialogue or a near-duplicate of it, else None."""
+        result = self.exact.get(dialogue_key(dialogue_text))
+        if result is not None or self.index is None or self.index.ntotal == 0:
+            return result
+        scores, ids = self.index.search(self._embed(dialogue_text), 1)
+        if scores[0][0] >= self.threshold:
+            return self.results[ids[0][0]]
+        return None
+
+    def store(self, dialogue_text: str, result: Any):
+        """Remember the LLM result for a dialogue (JSON-serializable when the cache has a path)."""
+        key = dialogue_key(dialogue_text)
+        known = key in self.exact
+        # Serialized before anything is stored, so a result the log cannot hold
+        # raises TypeError here without leaving the cache half-updated
+        line = None
+        if self.path is not None and not known:
+            line = json.dumps({"key": key, "result": result}, ensure_ascii=False) + "\n"
+        self.exact[key] = result
+        if known:
+            return
+        if line is not None:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        if not self.semantic:
+            return
+        vector = self._embed(dialogue_text)
+        if self.index is None:
+            self.index = _semantic_backend()[0].IndexFlatIP(vector.shape[1])
+        self.index.add(vector)
+        self.results.append(result)
+
+    def split_batch(self, dialogues_batch: List[str]) -> Tuple[Dict[int, Any], List[int]]:
+        """Return cached results by batch position, and the positions that still need the LLM."""
+        hits = {}
+        misses = []
+        for position, dialogue_text in enumerate(dialogues_batch):
+            result = self.lookup(dialogue_text)
+            if result is None:
+                misses.append(position)
+            else:
+                hits[position] = result
+        return hits, misses
+
+
+_default_cache = ResponseCache()
+lookup = _default_cache.lookup
+store = _default_cache.store
+split_batch = _default_cache.split_batch
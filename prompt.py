@@ -1,68 +1,295 @@
-def get_user_prompt_baseline(dialogues_batch):
-  dialogues_text = ""
-  for idx, dialogue in enumerate(dialogues_batch, 1):
-      dialogues_text += f"\n\n=== Dialogue {idx} ===\n{dialogue}\n"
-
-  prompt = f"""
+# Plain, fully annotated Python so it can optionally be compiled with mypyc
+# (`pip install mypy && mypyc prompt.py`); Python imports the built extension
+# in place of this file when one is present, and this source otherwise.
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import os
+import re
+import sys
+import textwrap
+import unicodedata
+from typing import Any, AnyStr, Callable, Deque, Dict, Iterable, Iterator, List, Match, Optional, Pattern, Sequence, Tuple
+
+_DIALOGUE_HEADER = "\n\n=== Dialogue %d ===\n"
+
+# Separator lines for the usual batch sizes, formatted once at import.
+_DIALOGUE_HEADERS = tuple(sys.intern(_DIALOGUE_HEADER % i) for i in range(1, 257))
+_DIALOGUE_HEADERS_UTF8 = tuple(header.encode("utf-8") for header in _DIALOGUE_HEADERS)
+
+
+def _dialogue_header(idx: int) -> str:
+    if idx <= len(_DIALOGUE_HEADERS):
+        return _DIALOGUE_HEADERS[idx - 1]
+    return _DIALOGUE_HEADER % idx
+
+
+# Dialogues longer than this are cut before they are spliced into a prompt:
+# the opening and the closing turns are kept, the middle is replaced by a marker.
+MAX_DIALOGUE_CHARS = 20000
+TRUNCATION_MARKER = "\n... [truncated %d turns] ...\n"
+# Share of max_chars kept from the start of a long dialogue; the rest is its end.
+TRUNCATION_HEAD_SHARE = 2 / 3
+
+
+def truncate_dialogue(dialogue: str, max_chars: int = MAX_DIALOGUE_CHARS) -> str:
+    """Head and tail of a dialogue longer than max_chars, cut on turn (line) boundaries where possible.
+
+    The marker counts the turns left out entirely; a turn that is cut keeps
+    its part and is not counted.
+    """
+    if len(dialogue) <= max_chars:
+        return dialogue
+    head_end = int(max_chars * TRUNCATION_HEAD_SHARE)
+    tail_start = len(dialogue) - (max_chars - head_end)
+    # Back off to the end of the last whole head turn and forward to the start
+    # of the first whole tail turn; a cut inside one huge turn stays as it is.
+    cut = dialogue.rfind("\n", 0, head_end)
+    if cut > 0:
+        head_end = cut
+    cut = dialogue.find("\n", tail_start)
+    if cut != -1 and cut + 1 < len(dialogue):
+        tail_start = cut + 1
+    # Turns between the last one the head reaches into and the first one the
+    # tail does (a turn's "\n" belongs to it)
+    if head_end > 0:
+        dropped = max(0, dialogue.count("\n", head_end - 1, tail_start) - 1)
+    elif tail_start < len(dialogue):
+        dropped = dialogue.count("\n", 0, tail_start)
+    else:
+        # Nothing kept (max_chars=0): every turn, the last one unterminated or not
+        dropped = dialogue.count("\n") + (not dialogue.endswith("\n"))
+    return dialogue[:head_end] + TRUNCATION_MARKER % dropped + dialogue[tail_start:]
+
+
+def _iter_dialogues(dialogues: Iterable[str], max_chars: int = MAX_DIALOGUE_CHARS) -> Iterator[str]:
+    for idx, dialogue in enumerate(dialogues, 1):
+        if len(dialogue) > max_chars:
+            dialogue = truncate_dialogue(dialogue, max_chars)
+        yield _dialogue_header(idx)
+        yield dialogue
+        yield "\n"
+
+
+def _prompt_parts(prefix: str, dialogues: Sequence[str], max_chars: int = MAX_DIALOGUE_CHARS) -> List[str]:
+    # [prefix, header, dialogue, "\n", ...] sized once and filled by slice
+    # assignment, so the batch is walked without a per-item Python loop.
+    n = len(dialogues)
+    parts = [prefix] + ["\n"] * (3 * n)
+    if n <= len(_DIALOGUE_HEADERS):
+        parts[1::3] = _DIALOGUE_HEADERS[:n]
+    else:
+        parts[1::3] = [_dialogue_header(idx) for idx in range(1, n + 1)]
+    parts[2::3] = [
+        dialogue if len(dialogue) <= max_chars else truncate_dialogue(dialogue, max_chars)
+        for dialogue in dialogues
+    ]
+    return parts
+
+
+def _prompt_parts_bytes(prefix: bytes, dialogues: Sequence[str], max_chars: int = MAX_DIALOGUE_CHARS) -> List[bytes]:
+    # Same layout as _prompt_parts, with every dialogue encoded on its own.
+    n = len(dialogues)
+    parts = [prefix] + [b"\n"] * (3 * n)
+    if n <= len(_DIALOGUE_HEADERS_UTF8):
+        parts[1::3] = _DIALOGUE_HEADERS_UTF8[:n]
+    else:
+        parts[1::3] = [_dialogue_header(idx).encode("utf-8") for idx in range(1, n + 1)]
+    parts[2::3] = [
+        (dialogue if len(dialogue) <= max_chars else truncate_dialogue(dialogue, max_chars)).encode("utf-8")
+        for dialogue in dialogues
+    ]
+    return parts
+
+
+def _canonical_prefix(template: str) -> str:
+    # Trailing spaces are invisible in the source and easy to change by accident,
+    # which would silently alter the prefix bytes the provider caches. Trailing
+    # tabs are kept: in the few-shot transcripts they mark an empty score field.
+    text = re.sub(r" +\n", "\n", textwrap.dedent(template).lstrip("\n"))
+    return text.rstrip() + "\n"
+
+
+# cl100k_base only approximates Gemini's tokenizer; without tiktoken we fall
+# back to ~4 characters per token. tiktoken is imported on the first count,
+# so workers that only build prompts never load it.
+@functools.lru_cache(maxsize=None)
+def _encoding() -> Optional[Any]:
+    try:
+        import tiktoken  # type: ignore[import-not-found]  # optional, see above
+    except ImportError:
+        return None
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+# Retries and repeated samples reuse the same batch, so built prompts are
+# cached. One cache serves every variant; the prefix is part of the key.
+@functools.lru_cache(maxsize=768)
+def _render(prefix: str, dialogues: Tuple[str, ...], max_chars: int) -> str:
+    # One join copies the prefix once, instead of again in a concat.
+    return "".join(_prompt_parts(prefix, dialogues, max_chars))
+
+
+# Same, for callers that pass an already formatted dialogue block; retries of
+# a request then get the finished prompt back without another concatenation.
+@functools.lru_cache(maxsize=256)
+def _render_text(prefix: str, dialogues_text: str) -> str:
+    return prefix + dialogues_text
+
+
+class PromptBuilder:
+    """Static prompt prefix prepared once; each call only formats the dialogues."""
+
+    __slots__ = ("prefix", "prefix_bytes", "_prefix_tokens")
+
+    def __init__(self, prefix: str, sha256: Optional[str] = None) -> None:
+        # Interned so the _render cache compares the key prefix by identity.
+        self.prefix = sys.intern(prefix)
+        self.prefix_bytes = prefix.encode("utf-8")
+        self._prefix_tokens: Optional[int] = None
+        if sha256 is not None and hashlib.sha256(self.prefix_bytes).hexdigest() != sha256:
+            raise ValueError("prompt prefix bytes changed; update the pinned sha256 if this was intended")
+
+    @property
+    def prefix_tokens(self) -> int:
+        # Counted on first use rather than at import.
+        if self._prefix_tokens is None:
+            self._prefix_tokens = count_tokens(self.prefix)
+        return self._prefix_tokens
+
+    def iter_chunks(self, dialogues_batch: Iterable[str], max_chars: int = MAX_DIALOGUE_CHARS) -> Iterator[str]:
+        yield self.prefix
+        yield from _iter_dialogues(dialogues_batch, max_chars)
+
+    def build(self, dialogues_batch: Iterable[str], max_chars: int = MAX_DIALOGUE_CHARS) -> str:
+        return _render(self.prefix, tuple(dialogues_batch), max_chars)
+
+    def build_from_text(self, dialogues_text: str) -> str:
+        return _render_text(self.prefix, dialogues_text)
+
+    def build_bytes(self, dialogues_batch: Iterable[str], max_chars: int = MAX_DIALOGUE_CHARS) -> bytes:
+        # Joined from pre-encoded pieces: an ASCII dialogue encodes as a plain copy,
+        # whereas one str join with the non-ASCII prefix would widen it first.
+        return b"".join(_prompt_parts_bytes(self.prefix_bytes, tuple(dialogues_batch), max_chars))
+
+    def build_bytes_from_text(self, dialogues_text: str) -> bytes:
+        return self.prefix_bytes + dialogues_text.encode("utf-8")
+
+
+# Few-shot transcripts shared by the barem and self-consistency prompts.
+_FEWSHOT_335 = """\
+SYSTEM	Can you tell me what types of movies you like?	OTHER
+USER	I really like comedies.	ENTITY_NAME+MOVIE_GENRE_OR_CATEGORY	3,3,3,4
+SYSTEM	ok, why do you like comedies? OTHER
+USER	I like to laugh. I like the lightheartedness of it, you know, nothing too serious, a true escape from everyday life. And just puts you in a good mood, and that's how I would prefer to be.	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY	3,3,3,4
+SYSTEM	got it, can you name a specific movie you really liked?	OTHER
+USER	Sure, Best in Show is one of my absolute favorites.	ENTITY_NAME+MOVIE_OR_SERIES	3,3,5,5
+SYSTEM	ok, why do you like that movie?	OTHER
+USER	Oh gosh. It's like I'ts perfect. It's a mockumentary style film and they are mocking the dog show world. So, the dog show world that they show is like a carbon copy of the real thing because it's inherently funny, so they don't have to really max with it. And a lot of the player they it there's a script for the movie but it's also ad libed.	ENTITY_OTHER+MOVIE_OR_SERIES	3,3,4,3
+USER	It's just hilarious. It's so original.	ENTITY_PREFERENCE+MOVIE_OR_SERIES	3,3,3,4
+USER	So much, so different, and just so funny. It makes you laugh every time you watch it.	ENTITY_PREFERENCE+MOVIE_OR_SERIES	3,3,3,4
+SYSTEM	ok, would you say you enjoy satire?	ENTITY_NAME+MOVIE_GENRE_OR_CATEGORY	
+USER	Yeah.	OTHER 3,3,4,4
+SYSTEM	ok, can you name a film you dislike?	OTHER
+USER	Sure, Bounty Hunter.	ENTITY_NAME+MOVIE_OR_SERIES	3,3,3,4
+SYSTEM	why didn't you like that movie?	OTHER
+USER	It was supposed to be a comedy, and not only was it not funny, it was confusing what they were going for. I think it was miscast.	ENTITY_PREFERENCE+MOVIE_OR_SERIES	3,3,2,3
+USER	It's Jennifer Aniston and I can't even think of his name, but somebody who I don't really care for. But I do like Jennifer usually, and it wasn't a good fit for her. Neither role really fit the actor, like they were sort of playing against type in both roles. I think it was kind of supposed to be almost like a almost like a buddy comedy, but or Cuz it was really focused on two people, but not really buddies, but they were in conflict. It wasn't funny.	ENTITY_PREFERENCE+PERSON	3,3,2,3
+USER	It kind of had like a more dramatic feel to it because it wasn't funny. It was just It was odd. Really.	ENTITY_PREFERENCE+MOVIE_OR_SERIES	4,4,2,4
+SYSTEM	was the acting bad?	OTHER
+USER	It wasn't great. It was not great.	ENTITY_PREFERENCE+MOVIE_OR_SERIES	3,3,2,2
+SYSTEM	ok, can you tell me have you watched the movie the shawshank redemption?	ENTITY_NAME+MOVIE_OR_SERIES	
+USER	Oh, yes.	OTHER 3,3,3,3
+SYSTEM	do you like that movie?	OTHER
+USER	It's a excellent movie.	ENTITY_PREFERENCE+MOVIE_OR_SERIES	3,3,3,5
+SYSTEM	ok, what about the movie did you enjoy?	OTHER
+USER	It really has a different feel to it. It's despite them being, you know, prisoners, they create very endearing characters who you rooting for, who you want to see have a better life. It is a You're transported to a different time so you can sort of capture what was going on better.	ENTITY_PREFERENCE+MOVIE_OR_SERIES	3,3,3,5
+USER	It very moving, it very and and it's very touching which usually does not happen with something that's sort of a prison drama. I don't you ever really view them as true prisoners some of whom shouldn't really have gotten as steep of sentences as they do or like somebody who walks who was there far too long for what it sounded like he was in for and then couldn't live in the real world having been locked up so long. So, it's it's it's a it's just a it's a excellent film.	ENTITY_PREFERENCE+MOVIE_OR_SERIES	3,3,3,5
+USER	with amazing acting, wonderful direction and it's just It's very special. It it really is. It's it's one of those wonder you look back and you wonder why didn't want to win Oscar.	ENTITY_PREFERENCE+MOVIE_OR_SERIES	3,3,5,5
+USER	OVERALL	OTHER 4,4,5,4
+"""
+
+_FEWSHOT_25 = """\
+SYSTEM	What kinds of movies do you like?	OTHER
+USER	I really like action movies.	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY	3,3,4
+USER	Like superhero movies.	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY	3,3,4
+SYSTEM	Why do you like action movies?	ENTITY_NAME+MOVIE_GENRE_OR_CATEGORY	
+USER	They're just really fun, energetic. They make me feel like, you know, I can be an action star, too. See lots of cool stunts, and usually lots of unique and cool locations.	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY	4,3,4
+SYSTEM	Alright, how about a movie you liked?	OTHER
+USER	I really liked Transporter.	ENTITY_NAME+MOVIE_OR_SERIES	3,3,5
+SYSTEM	Why did you like that movie?	OTHER
+USER	There's a lot of really cool stunts and a lot of awesome action scenes really like heart pounding excitement.	ENTITY_PREFERENCE+MOVIE_OR_SERIES	4,3,4
+SYSTEM	Well, is there a movie you did not like? OTHER
+USER	That action movie I didn't like. Hardcore Henry, I didn't like. I really didn't like the first person and it's just seem like a really tough violent for no reason.	ENTITY_NAME+MOVIE_OR_SERIES	3,3,3
+SYSTEM	Ok, then have you seen the movie John Wick ?	ENTITY_NAME+MOVIE_OR_SERIES	
+USER	I have. John Wick is awesome. ENTITY_OTHER+MOVIE_OR_SERIES	3,4,4
+SYSTEM	Why did you like John Wick?	ENTITY_NAME+MOVIE_OR_SERIES	
+USER	The story is really good. The characters are awesome, and there's a lot of cool themes in the movie.	ENTITY_PREFERENCE+MOVIE_OR_SERIES	4,4,3
+SYSTEM	Ok, thank you for sharing. Good bye.	OTHER
+USER	OVERALL	OTHER 4,4,4
+"""
+
+_FEWSHOT_26 = """\
+SYSTEM	What type of movies do you enjoy?	OTHER
+USER	I like movies that are based on true story.	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY	3,3,3
+SYSTEM	What appeals to you with these type of movies?	OTHER
+USER	I think it's just easier to get invested in the story knowing it's at least partially true, so it feels more real, like you can get more invested in the characters.	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY	3,4,3
+SYSTEM	Is there a specific movie you enjoy from this genre?	OTHER
+USER	I watched Apollo 13 recently, and that's a really good movie.	ENTITY_OTHER+MOVIE_OR_SERIES	3,3,3
+SYSTEM	What did you like about this movie?	OTHER
+USER	I've always liked space travel, like it's just an interesting idea, and so seeing the story of how their mission went wrong and how they got back was just really fascinating.	ENTITY_PREFERENCE+MOVIE_OR_SERIES	4,4,3
+SYSTEM	Are there any type of movies that you don't enjoy?	OTHER
+USER	I don't like comic book movies very much.	ENTITY_PREFERENCE+MOVIE_OR_SERIES	2,3,3
+SYSTEM	What about these movies is unappealing?	OTHER
+USER	There's just too many of them. Like I fell behind, and I've never felt like catching back up, so I just tend to ignore all of them, and they just generally don't interest me that much.	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY	3,2,3
+SYSTEM	Is there a specific movie that you heavily dislike?	OTHER
+USER	The movie I didn't like Available. I saw that recently, I didn't like that movie.	ENTITY_OTHER+MOVIE_OR_SERIES	3,2,3
+SYSTEM	What do you dislike about this movie? OTHER
+SYSTEM	Have you seen Armageddon	OTHER
+USER	No.	ENTITY_OTHER+MOVIE_OR_SERIES	1,1,3
+SYSTEM	How about the Incredibles 2	ENTITY_NAME+MOVIE_OR_SERIES	
+USER	Nope, haven't seen that.	ENTITY_OTHER+MOVIE_OR_SERIES	2,1,2
+USER	OVERALL	OTHER 2,2,2
+"""
+
+
+_BASELINE_PREFIX = _canonical_prefix("""
     You are an evaluator for customer service dialogues. 
     Use the provided few-shot examples as guidance. 
     For the target dialogue (below) produce a JSON object with six criteria scores (discrete values: 20,40,60,80,100) and a short one-sentence justification for each. Also output "OverallExperience". Use only evidence from the dialogue when justifying. And give an overall score for each dialogue in the end inside <score> tags (example <score>52</score>).
     Must have <score> tag for EACH dialogue in the batch.
     === FEW-SHOT EXAMPLES ===
-    SYSTEM          	Can you tell me what types of movies you like?          	OTHER
-    USER	I really like comedies.   ENTITY_NAME+MOVIE_GENRE_OR_CATEGORY           	3,3,3,4
-    SYSTEM          	ok, why do you like comedies? OTHER
-    USER	I like to laugh. I like the lightheartedness of it, you know, nothing too serious, a true escape from everyday life. And just puts you in a good mood, and that's how I would prefer to be.  	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY         	3,3,3,4
-    SYSTEM          	got it, can you name a specific movie you really liked?           	OTHER
-    USER	Sure, Best in Show is one of my absolute favorites.           	ENTITY_NAME+MOVIE_OR_SERIES   	3,3,5,5
-    SYSTEM          	ok, why do you like that movie?           	OTHER
-    USER	Oh gosh. It's like I'ts perfect. It's a mockumentary style film and they are mocking the dog show world. So, the dog show world that they show is like a carbon copy of the real thing because it's inherently funny, so they don't have to really max with it. And a lot of the player they it there's a script for the movie but it's also ad libed.           	ENTITY_OTHER+MOVIE_OR_SERIES 	3,3,4,3
-    USER	It's just hilarious. It's so original.           	ENTITY_PREFERENCE+MOVIE_OR_SERIES    	3,3,3,4
-    USER	So much, so different, and just so funny. It makes you laugh every time you watch it.         	ENTITY_PREFERENCE+MOVIE_OR_SERIES    	3,3,3,4
-    SYSTEM          	ok, would you say you enjoy satire?           	ENTITY_NAME+MOVIE_GENRE_OR_CATEGORY         	
-    USER	Yeah.	OTHER 3,3,4,4
-    SYSTEM          	ok, can you name a film you dislike? 	OTHER
-    USER	Sure, Bounty Hunter.	ENTITY_NAME+MOVIE_OR_SERIES   	3,3,3,4
-    SYSTEM          	why didn't you like that movie?            	OTHER
-    USER	It was supposed to be a comedy, and not only was it not funny, it was confusing what they were going for. I think it was miscast.           	ENTITY_PREFERENCE+MOVIE_OR_SERIES    	3,3,2,3
-    USER	It's Jennifer Aniston and I can't even think of his name, but somebody who I don't really care for. But I do like Jennifer usually, and it wasn't a good fit for her. Neither role really fit the actor, like they were sort of playing against type in both roles. I think it was kind of supposed to be almost like a almost like a buddy comedy, but or Cuz it was really focused on two people, but not really buddies, but they were in conflict. It wasn't funny.   ENTITY_PREFERENCE+PERSON         	3,3,2,3
-    USER	It kind of had like a more dramatic feel to it because it wasn't funny. It was just It was odd. Really.         	ENTITY_PREFERENCE+MOVIE_OR_SERIES    	4,4,2,4
-    SYSTEM          	was the acting bad?  	OTHER
-    USER	It wasn't great. It was not great.           	ENTITY_PREFERENCE+MOVIE_OR_SERIES    	3,3,2,2
-    SYSTEM          	ok, can you tell me have you watched the movie the shawshank redemption?  	ENTITY_NAME+MOVIE_OR_SERIES   	
-    USER	Oh, yes.          	OTHER 3,3,3,3
-    SYSTEM          	do you like that movie?            	OTHER
-    USER	It's a excellent movie.   ENTITY_PREFERENCE+MOVIE_OR_SERIES    	3,3,3,5
-    SYSTEM          	ok, what about the movie did you enjoy?        	OTHER
-    USER	It really has a different feel to it. It's despite them being, you know, prisoners, they create very endearing characters who you rooting for, who you want to see have a better life. It is a You're transported to a different time so you can sort of capture what was going on better.  	ENTITY_PREFERENCE+MOVIE_OR_SERIES    	3,3,3,5
-    USER	It very moving, it very and and it's very touching which usually does not happen with something that's sort of a prison drama. I don't you ever really view them as true prisoners some of whom shouldn't really have gotten as steep of sentences as they do or like somebody who walks who was there far too long for what it sounded like he was in for and then couldn't live in the real world having been locked up so long. So, it's it's it's a it's just a it's a excellent film.     	ENTITY_PREFERENCE+MOVIE_OR_SERIES           	3,3,3,5
-    USER	with amazing acting, wonderful direction and it's just It's very special. It it really is. It's it's one of those wonder you look back and you wonder why didn't want to win Oscar.  ENTITY_PREFERENCE+MOVIE_OR_SERIES    	3,3,5,5
-    USER	OVERALL        	OTHER 4,4,5,4
-    Expected output:
-    ```text
-    {{
-      "TaskSuccess": {{"score": 100, "justification": "System elicited full, relevant user responses and user answered the prompts fully (e.g., 'Sure, Best in Show...')."}},
-      "Helpfulness": {{"score": 100, "justification": "System's prompts elicited detailed user content and guided discussion (multiple targeted prompts)."}},
-      "Accuracy": {{"score": 100, "justification": "No factual contradictions in the dialogue; content is user preference, consistently reported."}},
-      "Understanding": {{"score": 100, "justification": "System questions matched user replies immediately, indicating correct intent recognition."}},
-      "Empathy": {{"score": 80, "justification": "Tone is polite and conversational but not explicitly emotional."}},
-      "Fluency": {{"score": 100, "justification": "Language flows naturally and is easy to follow."}},
-      "OverallExperience": {{"score": 100, "justification": "Weighted average heavily positive; user provided full, coherent responses."}}
-    }}
+""" + textwrap.indent(_FEWSHOT_335, "    ") + """    Expected output:
+    {"TaskSuccess":{"score":100,"justification":"System elicited full, relevant user responses and user answered the prompts fully (e.g., 'Sure, Best in Show...')."},"Helpfulness":{"score":100,"justification":"System's prompts elicited detailed user content and guided discussion (multiple targeted prompts)."},"Accuracy":{"score":100,"justification":"No factual contradictions in the dialogue; content is user preference, consistently reported."},"Understanding":{"score":100,"justification":"System questions matched user replies immediately, indicating correct intent recognition."},"Empathy":{"score":80,"justification":"Tone is polite and conversational but not explicitly emotional."},"Fluency":{"score":100,"justification":"Language flows naturally and is easy to follow."},"OverallExperience":{"score":100,"justification":"Weighted average heavily positive; user provided full, coherent responses."}}
     <score>52</score>
-    ```
     These are dialogues transcripts to evaluate:
-      {dialogues_text}
-  """
-  return prompt
+""")
+BASELINE_BUILDER = PromptBuilder(
+    _BASELINE_PREFIX, sha256="477e535de4c2684c5ad9d37b9ff2715add017f5843403502f664367db32e7b53"
+)
+
+
+def iter_user_prompt_baseline(dialogues_batch: Iterable[str], max_chars: int = MAX_DIALOGUE_CHARS) -> Iterator[str]:
+    return BASELINE_BUILDER.iter_chunks(dialogues_batch, max_chars)
+
 
+def get_user_prompt_baseline(dialogues_batch: Iterable[str], max_chars: int = MAX_DIALOGUE_CHARS) -> str:
+    return BASELINE_BUILDER.build(dialogues_batch, max_chars)
 
-def get_user_prompt_barem (dialogues_batch):
-  dialogues_text = ""
-  for idx, dialogue in enumerate(dialogues_batch, 1):
-      dialogues_text += f"\n\n=== Dialogue {idx} ===\n{dialogue}\n"
 
-  prompt = f"""
+def get_user_prompt_baseline_bytes(dialogues_batch: Iterable[str], max_chars: int = MAX_DIALOGUE_CHARS) -> bytes:
+    return BASELINE_BUILDER.build_bytes(dialogues_batch, max_chars)
+
+
+_BAREM_PREFIX = _canonical_prefix("""
   You are an evaluator for customer service dialogues.
   Use the provided few-shot examples as guidance.
   For the target dialogue, produce a JSON object with six criteria scores (discrete values: 20, 40, 60, 80, 100) and a one-sentence justification for each criterion.
@@ -70,8 +297,8 @@ def get_user_prompt_barem (dialogues_batch):
   After averaging, round the result down to the nearest discrete value (for example, an overall score of 90 should be scaled down to 80; 79 would also map to 60).
   Use only evidence explicitly found in the dialogue when providing justifications. And give an overall score for each dialogue in the end inside <score> tags (example <score>52</score>).
   === INSTRUCTIONS ===
-  You must apply the EXACT BAREM below. Do not invent extra rules. Use only text from the dialogue as evidence. Scores must be one of {{20,40,60,80,100}}. For "OverallExperience" compute a weighted average using weights:
-  TaskSuccess 0.40, Helpfulness 0.15, Accuracy 0.15, Understanding 0.10, Empathy 0.10, Fluency 0.10 — then map the resulting value to the nearest discrete bucket {{20,40,60,80,100}}.
+  You must apply the EXACT BAREM below. Do not invent extra rules. Use only text from the dialogue as evidence. Scores must be one of {20,40,60,80,100}. For "OverallExperience" compute a weighted average using weights:
+  TaskSuccess 0.40, Helpfulness 0.15, Accuracy 0.15, Understanding 0.10, Empathy 0.10, Fluency 0.10 — then map the resulting value to the nearest discrete bucket {20,40,60,80,100}.
   
   === DETAILED BAREM ===
   
@@ -126,130 +353,41 @@ def get_user_prompt_barem (dialogues_batch):
   === FEW-SHOT EXAMPLES ===
   
   (Example 1 — dialogue_id 335) 
-  SYSTEM           	Can you tell me what types of movies you like?          	OTHER
-  USER	I really like comedies.   ENTITY_NAME+MOVIE_GENRE_OR_CATEGORY                      	3,3,3,4
-  SYSTEM           	ok, why do you like comedies? OTHER
-  USER	I like to laugh. I like the lightheartedness of it, you know, nothing too serious, a true escape from everyday life. And just puts you in a good mood, and that's how I would prefer to be.  	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY         	3,3,3,4
-  SYSTEM           	got it, can you name a specific movie you really liked?            	OTHER
-  USER	Sure, Best in Show is one of my absolute favorites.                      	ENTITY_NAME+MOVIE_OR_SERIES   	3,3,5,5
-  SYSTEM           	ok, why do you like that movie?           	OTHER
-  USER	Oh gosh. It's like I'ts perfect. It's a mockumentary style film and they are mocking the dog show world. So, the dog show world that they show is like a carbon copy of the real thing because it's inherently funny, so they don't have to really max with it. And a lot of the player they it there's a script for the movie but it's also ad libed.                      	ENTITY_OTHER+MOVIE_OR_SERIES 	3,3,4,3
-  USER	It's just hilarious. It's so original.                      	ENTITY_PREFERENCE+MOVIE_OR_SERIES       3,3,3,4
-  USER	So much, so different, and just so funny. It makes you laugh every time you watch it.          	ENTITY_PREFERENCE+MOVIE_OR_SERIES       3,3,3,4
-  SYSTEM           	ok, would you say you enjoy satire?                      	ENTITY_NAME+MOVIE_GENRE_OR_CATEGORY         	
-  USER	Yeah.	OTHER 3,3,4,4
-  SYSTEM           	ok, can you name a film you dislike?    OTHER
-  USER	Sure, Bounty Hunter.	ENTITY_NAME+MOVIE_OR_SERIES   	3,3,3,4
-  SYSTEM           	why didn't you like that movie?            	OTHER
-  USER	It was supposed to be a comedy, and not only was it not funny, it was confusing what they were going for. I think it was miscast.                      	ENTITY_PREFERENCE+MOVIE_OR_SERIES       3,3,2,3
-  USER	It's Jennifer Aniston and I can't even think of his name, but somebody who I don't really care for. But I do like Jennifer usually, and it wasn't a good fit for her. Neither role really fit the actor, like they were sort of playing against type in both roles. I think it was kind of supposed to be almost like a almost like a buddy comedy, but or Cuz it was really focused on two people, but not really buddies, but they were in conflict. It wasn't funny.   ENTITY_PREFERENCE+PERSON         	3,3,2,3
-  USER	It kind of had like a more dramatic feel to it because it wasn't funny. It was just It was odd. Really.         	ENTITY_PREFERENCE+MOVIE_OR_SERIES       4,4,2,4
-  SYSTEM           	was the acting bad?  	OTHER
-  USER	It wasn't great. It was not great.                      	ENTITY_PREFERENCE+MOVIE_OR_SERIES       3,3,2,2
-  SYSTEM           	ok, can you tell me have you watched the movie the shawshank redemption?     ENTITY_NAME+MOVIE_OR_SERIES   	
-  USER	Oh, yes.           	OTHER 3,3,3,3
-  SYSTEM           	do you like that movie?            	OTHER
-  USER	It's a excellent movie.   ENTITY_PREFERENCE+MOVIE_OR_SERIES       3,3,3,5
-  SYSTEM           	ok, what about the movie did you enjoy?        	OTHER
-  USER	It really has a different feel to it. It's despite them being, you know, prisoners, they create very endearing characters who you rooting for, who you want to see have a better life. It is a You're transported to a different time so you can sort of capture what was going on better.  	ENTITY_PREFERENCE+MOVIE_OR_SERIES       3,3,3,5
-  USER	It very moving, it very and and it's very touching which usually does not happen with something that's sort of a prison drama. I don't you ever really view them as true prisoners some of whom shouldn't really have gotten as steep of sentences as they do or like somebody who walks who was there far too long for what it sounded like he was in for and then couldn't live in the real world having been locked up so long. So, it's it's it's a it's just a it's a excellent film.     	ENTITY_PREFERENCE+MOVIE_OR_SERIES                      	3,3,3,5
-  USER	with amazing acting, wonderful direction and it's just It's very special. It it really is. It's it's one of those wonder you look back and you wonder why didn't want to win Oscar.  ENTITY_PREFERENCE+MOVIE_OR_SERIES       3,3,5,5
-  USER	OVERALL        	OTHER 4,4,5,4
-  Expected annotated scoring (apply barem):
-  ```text
-  {{
-  "TaskSuccess": {{"score": 100, "justification": "System requested named movie and user provided 'Best in Show' directly."}},
-  "Helpfulness": {{"score": 100, "justification": "Series of targeted prompts elicited detailed reasons."}},
-  "Accuracy": {{"score": 100, "justification": "No contradictions; content is user preference and consistent."}},
-  "Understanding": {{"score": 100, "justification": "Agent questions matched user replies immediately."}},
-  "Empathy": {{"score": 80, "justification": "Polite tone but limited explicit empathy language."}},
-  "Fluency": {{"score": 100, "justification": "Utterances are coherent and fluent."}},
-  "OverallExperience": {{"score": 100, "justification": "Weighted average -> maps to 100 using specified weights."}}
-  }}
+""" + textwrap.indent(_FEWSHOT_335, "  ") + """  Expected annotated scoring (apply barem):
+  {"TaskSuccess":{"score":100,"justification":"System requested named movie and user provided 'Best in Show' directly."},"Helpfulness":{"score":100,"justification":"Series of targeted prompts elicited detailed reasons."},"Accuracy":{"score":100,"justification":"No contradictions; content is user preference and consistent."},"Understanding":{"score":100,"justification":"Agent questions matched user replies immediately."},"Empathy":{"score":80,"justification":"Polite tone but limited explicit empathy language."},"Fluency":{"score":100,"justification":"Utterances are coherent and fluent."},"OverallExperience":{"score":100,"justification":"Weighted average -> maps to 100 using specified weights."}}
   <score>100</score>
-  ```
   
   (Example 2 — dialogue_id 25)
-  SYSTEM           	What kinds of movies do you like?     	OTHER
-  USER	I really like action movies.                      	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY         	3,3,4
-  USER	Like superhero movies.                      	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY         	3,3,4
-  SYSTEM           	Why do you like action movies?                      	ENTITY_NAME+MOVIE_GENRE_OR_CATEGORY         	
-  USER	They're just really fun, energetic. They make me feel like, you know, I can be an action star, too. See lots of cool stunts, and usually lots of unique and cool locations.                      	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY                    	4,3,4
-  SYSTEM           	Alright, how about a movie you liked?  OTHER
-  USER	I really liked Transporter.        	ENTITY_NAME+MOVIE_OR_SERIES   	3,3,5
-  SYSTEM           	Why did you like that movie?    OTHER
-  USER	There's a lot of really cool stunts and a lot of awesome action scenes really like heart pounding excitement.      ENTITY_PREFERENCE+MOVIE_OR_SERIES       4,3,4
-  SYSTEM           	Well, is there a movie you did not like? OTHER
-  USER	That action movie I didn't like. Hardcore Henry, I didn't like. I really didn't like the first person and it's just seem like a really tough violent for no reason.                      	ENTITY_NAME+MOVIE_OR_SERIES   	3,3,3
-  SYSTEM           	Ok, then have you seen the movie John Wick ?                      	ENTITY_NAME+MOVIE_OR_SERIES   	
-  USER	I have. John Wick is awesome. ENTITY_OTHER+MOVIE_OR_SERIES    3,4,4
-  SYSTEM           	Why did you like John Wick?     ENTITY_NAME+MOVIE_OR_SERIES   	
-  USER	The story is really good. The characters are awesome, and there's a lot of cool themes in the movie.    ENTITY_PREFERENCE+MOVIE_OR_SERIES       4,4,3
-  SYSTEM           	Ok, thank you for sharing. Good bye.	OTHER
-  USER	OVERALL        	OTHER 4,4,4
-  Expected:
-  ```text
-  {{
-  "TaskSuccess": {{"score": 100, "justification": "User provided 'Transporter' and reasons after system prompts."}},
-  "Helpfulness": {{"score": 80, "justification": "Elicitation effective but minimal extra guidance."}},
-  "Accuracy": {{"score": 100, "justification": "No contradictions."}},
-  "Understanding": {{"score": 100, "justification": "Intent recognized and followed."}},
-  "Empathy": {{"score": 60, "justification": "Neutral tone; polite but not empathetic."}},
-  "Fluency": {{"score": 100, "justification": "Language clear."}},
-  "OverallExperience": {{"score": 80, "justification": "Weighted average -> 80."}}
-  }}
+""" + textwrap.indent(_FEWSHOT_25, "  ") + """  Expected:
+  {"TaskSuccess":{"score":100,"justification":"User provided 'Transporter' and reasons after system prompts."},"Helpfulness":{"score":80,"justification":"Elicitation effective but minimal extra guidance."},"Accuracy":{"score":100,"justification":"No contradictions."},"Understanding":{"score":100,"justification":"Intent recognized and followed."},"Empathy":{"score":60,"justification":"Neutral tone; polite but not empathetic."},"Fluency":{"score":100,"justification":"Language clear."},"OverallExperience":{"score":80,"justification":"Weighted average -> 80."}}
   <score>80</score>
-  ```
 
   
   (Example 3 — dialogue_id 26)
-  SYSTEM           	What type of movies do you enjoy?       OTHER
-  USER	I like movies that are based on true story.                      	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY         	3,3,3
-  SYSTEM           	What appeals to you with these type of movies?        	OTHER
-  USER	I think it's just easier to get invested in the story knowing it's at least partially true, so it feels more real, like you can get more invested in the characters.                      	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY         	3,4,3
-  SYSTEM           	Is there a specific movie you enjoy from this genre? 	OTHER
-  USER	I watched Apollo 13 recently, and that's a really good movie.                      	ENTITY_OTHER+MOVIE_OR_SERIES 	3,3,3
-  SYSTEM           	What did you like about this movie?  	OTHER
-  USER	I've always liked space travel, like it's just an interesting idea, and so seeing the story of how their mission went wrong and how they got back was just really fascinating.                   	ENTITY_PREFERENCE+MOVIE_OR_SERIES       4,4,3
-  SYSTEM           	Are there any type of movies that you don't enjoy?    	OTHER
-  USER	I don't like comic book movies very much.                      	ENTITY_PREFERENCE+MOVIE_OR_SERIES       2,3,3
-  SYSTEM           	What about these movies is unappealing?    	OTHER
-  USER	There's just too many of them. Like I fell behind, and I've never felt like catching back up, so I just tend to ignore all of them, and they just generally don't interest me that much.   ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY            3,2,3
-  SYSTEM           	Is there a specific movie that you heavily dislike?      	OTHER
-  USER	The movie I didn't like Available. I saw that recently, I didn't like that movie.                      	ENTITY_OTHER+MOVIE_OR_SERIES 	3,2,3
-  SYSTEM           	What do you dislike about this movie? OTHER
-  SYSTEM           	Have you seen Armageddon 	OTHER
-  USER	No.    	ENTITY_OTHER+MOVIE_OR_SERIES 	1,1,3
-  SYSTEM           	How about the Incredibles 2 	ENTITY_NAME+MOVIE_OR_SERIES   	
-  USER	Nope, haven't seen that.         	ENTITY_OTHER+MOVIE_OR_SERIES 	2,1,2
-  USER	OVERALL        	OTHER 2,2,2
-  Expected:
-  ```text
-  {{
-  "TaskSuccess": {{"score": 40, "justification": "Interaction is repetitive and yields limited actionable content."}},
-  "Helpfulness": {{"score": 40, "justification": "Prompts are generic and do not improve depth."}},
-  "Accuracy": {{"score": 60, "justification": "No explicit contradictions, but information is shallow."}},
-  "Understanding": {{"score": 60, "justification": "Some repeated prompts suggest partial understanding."}},
-  "Empathy": {{"score": 60, "justification": "Polite but not empathetic."}},
-  "Fluency": {{"score": 60, "justification": "Understandable but only moderately fluent."}},
-  "OverallExperience": {{"score": 40, "justification": "Weighted average rounds to 40 per specified mapping."}}
-  }}
+""" + textwrap.indent(_FEWSHOT_26, "  ") + """  Expected:
+  {"TaskSuccess":{"score":40,"justification":"Interaction is repetitive and yields limited actionable content."},"Helpfulness":{"score":40,"justification":"Prompts are generic and do not improve depth."},"Accuracy":{"score":60,"justification":"No explicit contradictions, but information is shallow."},"Understanding":{"score":60,"justification":"Some repeated prompts suggest partial understanding."},"Empathy":{"score":60,"justification":"Polite but not empathetic."},"Fluency":{"score":60,"justification":"Understandable but only moderately fluent."},"OverallExperience":{"score":40,"justification":"Weighted average rounds to 40 per specified mapping."}}
   <score>40</score>
-  ```
 
   These are dialogues transcripts to evaluate:
-  {dialogues_text}
+""")
+BAREM_BUILDER = PromptBuilder(
+    _BAREM_PREFIX, sha256="c0765bf492664563a2db913acee1f4719593570dd19a08fec3957680e805c23a"
+)
 
-  """
-  return prompt
 
-def get_user_prompting_self_consistency (dialogues_batch) -> str:
-    
-    dialogues_text = ""
-    for idx, dialogue in enumerate(dialogues_batch, 1):
-        dialogues_text += f"\n\n=== Dialogue {idx} ===\n{dialogue}\n"
-        
-    prompt = f"""
+def iter_user_prompt_barem(dialogues_batch: Iterable[str], max_chars: int = MAX_DIALOGUE_CHARS) -> Iterator[str]:
+    return BAREM_BUILDER.iter_chunks(dialogues_batch, max_chars)
+
+
+def get_user_prompt_barem (dialogues_batch: Iterable[str], max_chars: int = MAX_DIALOGUE_CHARS) -> str:
+    return BAREM_BUILDER.build(dialogues_batch, max_chars)
+
+
+def get_user_prompt_barem_bytes(dialogues_batch: Iterable[str], max_chars: int = MAX_DIALOGUE_CHARS) -> bytes:
+    return BAREM_BUILDER.build_bytes(dialogues_batch, max_chars)
+
+
+_SELF_CONSISTENCY_PREFIX = _canonical_prefix("""
         === INSTRUCTION (Read carefully) ===
         You are an expert human-like evaluator. Given a dialogue transcript, produce a single JSON object that scores the conversation on six categories and an OverallExperience value (0-100). Use the chain-of-thought (CoT) to *inform* each category's justification, but keep the justifications concise and structured.
 
@@ -283,532 +421,240 @@ def get_user_prompting_self_consistency (dialogues_batch) -> str:
 
         === FEW-SHOT EXAMPLES ===
         (Example 1 — dialogue_id 335) 
-        SYSTEM           	Can you tell me what types of movies you like?          	OTHER
-        USER	I really like comedies.   ENTITY_NAME+MOVIE_GENRE_OR_CATEGORY                      	3,3,3,4
-        SYSTEM           	ok, why do you like comedies? OTHER
-        USER	I like to laugh. I like the lightheartedness of it, you know, nothing too serious, a true escape from everyday life. And just puts you in a good mood, and that's how I would prefer to be.  	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY         	3,3,3,4
-        SYSTEM           	got it, can you name a specific movie you really liked?            	OTHER
-        USER	Sure, Best in Show is one of my absolute favorites.                      	ENTITY_NAME+MOVIE_OR_SERIES   	3,3,5,5
-        SYSTEM           	ok, why do you like that movie?           	OTHER
-        USER	Oh gosh. It's like I'ts perfect. It's a mockumentary style film and they are mocking the dog show world. So, the dog show world that they show is like a carbon copy of the real thing because it's inherently funny, so they don't have to really max with it. And a lot of the player they it there's a script for the movie but it's also ad libed.                      	ENTITY_OTHER+MOVIE_OR_SERIES 	3,3,4,3
-        USER	It's just hilarious. It's so original.                      	ENTITY_PREFERENCE+MOVIE_OR_SERIES       3,3,3,4
-        USER	So much, so different, and just so funny. It makes you laugh every time you watch it.          	ENTITY_PREFERENCE+MOVIE_OR_SERIES       3,3,3,4
-        SYSTEM           	ok, would you say you enjoy satire?                      	ENTITY_NAME+MOVIE_GENRE_OR_CATEGORY         	
-        USER	Yeah.	OTHER 3,3,4,4
-        SYSTEM           	ok, can you name a film you dislike?    OTHER
-        USER	Sure, Bounty Hunter.	ENTITY_NAME+MOVIE_OR_SERIES   	3,3,3,4
-        SYSTEM           	why didn't you like that movie?            	OTHER
-        USER	It was supposed to be a comedy, and not only was it not funny, it was confusing what they were going for. I think it was miscast.                      	ENTITY_PREFERENCE+MOVIE_OR_SERIES       3,3,2,3
-        USER	It's Jennifer Aniston and I can't even think of his name, but somebody who I don't really care for. But I do like Jennifer usually, and it wasn't a good fit for her. Neither role really fit the actor, like they were sort of playing against type in both roles. I think it was kind of supposed to be almost like a almost like a buddy comedy, but or Cuz it was really focused on two people, but not really buddies, but they were in conflict. It wasn't funny.   ENTITY_PREFERENCE+PERSON         	3,3,2,3
-        USER	It kind of had like a more dramatic feel to it because it wasn't funny. It was just It was odd. Really.         	ENTITY_PREFERENCE+MOVIE_OR_SERIES       4,4,2,4
-        SYSTEM           	was the acting bad?  	OTHER
-        USER	It wasn't great. It was not great.                      	ENTITY_PREFERENCE+MOVIE_OR_SERIES       3,3,2,2
-        SYSTEM           	ok, can you tell me have you watched the movie the shawshank redemption?     ENTITY_NAME+MOVIE_OR_SERIES   	
-        USER	Oh, yes.           	OTHER 3,3,3,3
-        SYSTEM           	do you like that movie?            	OTHER
-        USER	It's a excellent movie.   ENTITY_PREFERENCE+MOVIE_OR_SERIES       3,3,3,5
-        SYSTEM           	ok, what about the movie did you enjoy?        	OTHER
-        USER	It really has a different feel to it. It's despite them being, you know, prisoners, they create very endearing characters who you rooting for, who you want to see have a better life. It is a You're transported to a different time so you can sort of capture what was going on better.  	ENTITY_PREFERENCE+MOVIE_OR_SERIES       3,3,3,5
-        USER	It very moving, it very and and it's very touching which usually does not happen with something that's sort of a prison drama. I don't you ever really view them as true prisoners some of whom shouldn't really have gotten as steep of sentences as they do or like somebody who walks who was there far too long for what it sounded like he was in for and then couldn't live in the real world having been locked up so long. So, it's it's it's a it's just a it's a excellent film.     	ENTITY_PREFERENCE+MOVIE_OR_SERIES                      	3,3,3,5
-        USER	with amazing acting, wonderful direction and it's just It's very special. It it really is. It's it's one of those wonder you look back and you wonder why didn't want to win Oscar.  ENTITY_PREFERENCE+MOVIE_OR_SERIES       3,3,5,5
-        USER	OVERALL        	OTHER 4,4,5,4
-        Expected output:
-        ```text
-        {{
-            "TaskSuccess": {{
-            "score": 85,
-            "justification": "System gathered key preferences but didn't synthesize them into recommendations or deeper insights."
-            }},
-            "Helpfulness": {{
-            "score": 80,
-            "justification": "Asked relevant follow-ups but provided no proactive or value-added assistance."
-            }},
-            "Accuracy": {{
-            "score": 90,
-            "justification": "Responses were factually correct with only minor generic phrasing."
-            }},
-            "Understanding": {{
-            "score": 85,
-            "justification": "Generally tracked user input but missed nuances in emotional or contextual cues."
-            }},
-            "Empathy": {{
-            "score": 75,
-            "justification": "Polite but lacked emotional acknowledgment or validation of user feelings."
-            }},
-            "Fluency": {{
-            "score": 95,
-            "justification": "Utterances were natural and fluent, though occasionally repetitive or terse."
-            }},
-            "OverallExperience": {{
-            "score": 85,
-            "justification": "Weighted average aligns with the observed ~4.25/5 user satisfaction (85/100)."
-            }}
-        }}
+""" + textwrap.indent(_FEWSHOT_335, "        ") + """        Expected output:
+        {"TaskSuccess":{"score":85,"justification":"System gathered key preferences but didn't synthesize them into recommendations or deeper insights."},"Helpfulness":{"score":80,"justification":"Asked relevant follow-ups but provided no proactive or value-added assistance."},"Accuracy":{"score":90,"justification":"Responses were factually correct with only minor generic phrasing."},"Understanding":{"score":85,"justification":"Generally tracked user input but missed nuances in emotional or contextual cues."},"Empathy":{"score":75,"justification":"Polite but lacked emotional acknowledgment or validation of user feelings."},"Fluency":{"score":95,"justification":"Utterances were natural and fluent, though occasionally repetitive or terse."},"OverallExperience":{"score":85,"justification":"Weighted average aligns with the observed ~4.25/5 user satisfaction (85/100)."}}
         <score>85</score>
-        ```
         
         (Example 2 — dialogue_id 25)
-        SYSTEM           	What kinds of movies do you like?     	OTHER
-        USER	I really like action movies.                      	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY         	3,3,4
-        USER	Like superhero movies.                      	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY         	3,3,4
-        SYSTEM           	Why do you like action movies?                      	ENTITY_NAME+MOVIE_GENRE_OR_CATEGORY         	
-        USER	They're just really fun, energetic. They make me feel like, you know, I can be an action star, too. See lots of cool stunts, and usually lots of unique and cool locations.                      	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY                    	4,3,4
-        SYSTEM           	Alright, how about a movie you liked?  OTHER
-        USER	I really liked Transporter.        	ENTITY_NAME+MOVIE_OR_SERIES   	3,3,5
-        SYSTEM           	Why did you like that movie?    OTHER
-        USER	There's a lot of really cool stunts and a lot of awesome action scenes really like heart pounding excitement.      ENTITY_PREFERENCE+MOVIE_OR_SERIES       4,3,4
-        SYSTEM           	Well, is there a movie you did not like? OTHER
-        USER	That action movie I didn't like. Hardcore Henry, I didn't like. I really didn't like the first person and it's just seem like a really tough violent for no reason.                      	ENTITY_NAME+MOVIE_OR_SERIES   	3,3,3
-        SYSTEM           	Ok, then have you seen the movie John Wick ?                      	ENTITY_NAME+MOVIE_OR_SERIES   	
-        USER	I have. John Wick is awesome. ENTITY_OTHER+MOVIE_OR_SERIES    3,4,4
-        SYSTEM           	Why did you like John Wick?     ENTITY_NAME+MOVIE_OR_SERIES   	
-        USER	The story is really good. The characters are awesome, and there's a lot of cool themes in the movie.    ENTITY_PREFERENCE+MOVIE_OR_SERIES       4,4,3
-        SYSTEM           	Ok, thank you for sharing. Good bye.	OTHER
-        USER	OVERALL        	OTHER 4,4,4
-        Expected:
-        ```text
-        {{
-            "TaskSuccess": {{
-            "score": 80,
-            "justification": "System gathered genre preference and examples of liked/disliked movies with reasons, fulfilling basic task goals but ending abruptly without synthesis."
-            }},
-            "Helpfulness": {{
-            "score": 75,
-            "justification": "Asked relevant questions but provided no proactive value or follow-up based on user's action-movie interest."
-            }},
-            "Accuracy": {{
-            "score": 85,
-            "justification": "All system references were factually correct; minor deduction for generic phrasing without deeper adaptation."
-            }},
-            "Understanding": {{
-            "score": 80,
-            "justification": "Responded to surface-level inputs but missed opportunities to connect related preferences (e.g., 'Transporter' and 'John Wick')."
-            }},
-            "Empathy": {{
-            "score": 70,
-            "justification": "Polite but showed no emotional attunement to user's excitement or criticism."
-            }},
-            "Fluency": {{
-            "score": 90,
-            "justification": "Utterances were fluent and natural, though the closing was abrupt."
-            }},
-            "OverallExperience": {{
-            "score": 80,
-            "justification": "Weighted average = (0.4*80)+(0.15*75)+(0.15*85)+(0.1*80)+(0.1*70)+(0.1*90) = 80, matching the sample's average satisfaction of 4.0/5 (80/100)."
-            }}
-        }}
+""" + textwrap.indent(_FEWSHOT_25, "        ") + """        Expected:
+        {"TaskSuccess":{"score":80,"justification":"System gathered genre preference and examples of liked/disliked movies with reasons, fulfilling basic task goals but ending abruptly without synthesis."},"Helpfulness":{"score":75,"justification":"Asked relevant questions but provided no proactive value or follow-up based on user's action-movie interest."},"Accuracy":{"score":85,"justification":"All system references were factually correct; minor deduction for generic phrasing without deeper adaptation."},"Understanding":{"score":80,"justification":"Responded to surface-level inputs but missed opportunities to connect related preferences (e.g., 'Transporter' and 'John Wick')."},"Empathy":{"score":70,"justification":"Polite but showed no emotional attunement to user's excitement or criticism."},"Fluency":{"score":90,"justification":"Utterances were fluent and natural, though the closing was abrupt."},"OverallExperience":{"score":80,"justification":"Weighted average = (0.4*80)+(0.15*75)+(0.15*85)+(0.1*80)+(0.1*70)+(0.1*90) = 80, matching the sample's average satisfaction of 4.0/5 (80/100)."}}
         <score>80</score>
-        ```
         
         (Example 3 — dialogue_id 26)
-        SYSTEM           	What type of movies do you enjoy?       OTHER
-        USER	I like movies that are based on true story.                      	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY         	3,3,3
-        SYSTEM           	What appeals to you with these type of movies?        	OTHER
-        USER	I think it's just easier to get invested in the story knowing it's at least partially true, so it feels more real, like you can get more invested in the characters.                      	ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY         	3,4,3
-        SYSTEM           	Is there a specific movie you enjoy from this genre? 	OTHER
-        USER	I watched Apollo 13 recently, and that's a really good movie.                      	ENTITY_OTHER+MOVIE_OR_SERIES 	3,3,3
-        SYSTEM           	What did you like about this movie?  	OTHER
-        USER	I've always liked space travel, like it's just an interesting idea, and so seeing the story of how their mission went wrong and how they got back was just really fascinating.                   	ENTITY_PREFERENCE+MOVIE_OR_SERIES       4,4,3
-        SYSTEM           	Are there any type of movies that you don't enjoy?    	OTHER
-        USER	I don't like comic book movies very much.                      	ENTITY_PREFERENCE+MOVIE_OR_SERIES       2,3,3
-        SYSTEM           	What about these movies is unappealing?    	OTHER
-        USER	There's just too many of them. Like I fell behind, and I've never felt like catching back up, so I just tend to ignore all of them, and they just generally don't interest me that much.   ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY            3,2,3
-        SYSTEM           	Is there a specific movie that you heavily dislike?      	OTHER
-        USER	The movie I didn't like Available. I saw that recently, I didn't like that movie.                      	ENTITY_OTHER+MOVIE_OR_SERIES 	3,2,3
-        SYSTEM           	What do you dislike about this movie? OTHER
-        SYSTEM           	Have you seen Armageddon 	OTHER
-        USER	No.    	ENTITY_OTHER+MOVIE_OR_SERIES 	1,1,3
-        SYSTEM           	How about the Incredibles 2 	ENTITY_NAME+MOVIE_OR_SERIES   	
-        USER	Nope, haven't seen that.         	ENTITY_OTHER+MOVIE_OR_SERIES 	2,1,2
-        USER	OVERALL        	OTHER 2,2,2
-        Expected:
-        ```text
-        {{
-            "TaskSuccess": {{
-            "score": 40,
-            "justification": "System failed to stay on task—abandoned exploration of the disliked movie 'Available' and asked about irrelevant unseen films, missing core objectives."
-            }},
-            "Helpfulness": {{
-            "score": 35,
-            "justification": "Initial questions were relevant, but later prompts about unseen movies ('Armageddon', 'Incredibles 2') were unhelpful and ignored user's stated disinterest in comic/superhero genres."
-            }},
-            "Accuracy": {{
-            "score": 50,
-            "justification": "No factual errors, but poor contextual alignment—recommended probing into genres the user explicitly dismissed."
-            }},
-            "Understanding": {{
-            "score": 40,
-            "justification": "Showed surface-level comprehension but failed to connect user's dislike of comic-book saturation to avoid related topics."
-            }},
-            "Empathy": {{
-            "score": 30,
-            "justification": "Ignored user's expressed frustration about being overwhelmed; pressed on irrelevant films without validation or adjustment."
-            }},
-            "Fluency": {{
-            "score": 60,
-            "justification": "Grammatically fluent but conversationally disjointed due to abrupt, off-topic questions that disrupted coherence."
-            }},
-            "OverallExperience": {{
-            "score": 40,
-            "justification": "Weighted average = (0.4*40)+(0.15*35)+(0.15*50)+(0.1*40)+(0.1*30)+(0.1*60) = 40, matching the sample's average satisfaction of 2.0/5 (40/100)."
-            }}
-        }}
+""" + textwrap.indent(_FEWSHOT_26, "        ") + """        Expected:
+        {"TaskSuccess":{"score":40,"justification":"System failed to stay on task—abandoned exploration of the disliked movie 'Available' and asked about irrelevant unseen films, missing core objectives."},"Helpfulness":{"score":35,"justification":"Initial questions were relevant, but later prompts about unseen movies ('Armageddon', 'Incredibles 2') were unhelpful and ignored user's stated disinterest in comic/superhero genres."},"Accuracy":{"score":50,"justification":"No factual errors, but poor contextual alignment—recommended probing into genres the user explicitly dismissed."},"Understanding":{"score":40,"justification":"Showed surface-level comprehension but failed to connect user's dislike of comic-book saturation to avoid related topics."},"Empathy":{"score":30,"justification":"Ignored user's expressed frustration about being overwhelmed; pressed on irrelevant films without validation or adjustment."},"Fluency":{"score":60,"justification":"Grammatically fluent but conversationally disjointed due to abrupt, off-topic questions that disrupted coherence."},"OverallExperience":{"score":40,"justification":"Weighted average = (0.4*40)+(0.15*35)+(0.15*50)+(0.1*40)+(0.1*30)+(0.1*60) = 40, matching the sample's average satisfaction of 2.0/5 (40/100)."}}
         <score>40</score>
-        ```
-
-        === Dialogue ===
-        {dialogues_text}
 
         === Output JSON (ONLY) ===
-        ```text
-        {{
-            "TaskSuccess": {{"score": 40, "justification": "Interaction is repetitive and yields limited actionable content."}},
-            "Helpfulness": {{"score": 40, "justification": "Prompts are generic and do not improve depth."}},
-            "Accuracy": {{"score": 60, "justification": "No explicit contradictions, but information is shallow."}},
-            "Understanding": {{"score": 60, "justification": "Some repeated prompts suggest partial understanding."}},
-            "Empathy": {{"score": 60, "justification": "Polite but not empathetic."}},
-            "Fluency": {{"score": 60, "justification": "Understandable but only moderately fluent."}},
-            "OverallExperience": {{"score": 40, "justification": "Weighted average rounds to 40 per specified mapping."}}
-        }}
+        {"TaskSuccess":{"score":40,"justification":"Interaction is repetitive and yields limited actionable content."},"Helpfulness":{"score":40,"justification":"Prompts are generic and do not improve depth."},"Accuracy":{"score":60,"justification":"No explicit contradictions, but information is shallow."},"Understanding":{"score":60,"justification":"Some repeated prompts suggest partial understanding."},"Empathy":{"score":60,"justification":"Polite but not empathetic."},"Fluency":{"score":60,"justification":"Understandable but only moderately fluent."},"OverallExperience":{"score":40,"justification":"Weighted average rounds to 40 per specified mapping."}}
         <score>40</score>
-        ```
-        
-    """
 
-    return prompt
+        === Dialogue ===
+""")
+SELF_CONSISTENCY_BUILDER = PromptBuilder(
+    _SELF_CONSISTENCY_PREFIX, sha256="c4a4981f92e193b6f2f2ae19dbf7aa3edfee4197083f562204cd10a5d34c4738"
+)
+
 
-def get_user_prompting_agent_debate(dialogues_batch):
-    dialogues_text = ""
-    for idx, dialogue in enumerate(dialogues_batch, 1):
-        dialogues_text += f"\n\n=== Dialogue {{idx}} ===\n{{dialogue}}\n" 
-        
-    prompt = f"""
-        You are a multi-agent evaluator consisting of three agents — Evaluator (Agent A), Critic (Agent B), and Referee (Agent C) — collaborating to rate customer-service dialogues between SYSTEM (assistant) and USER (customer).
+def iter_user_prompting_self_consistency(dialogues_batch: Iterable[str], max_chars: int = MAX_DIALOGUE_CHARS) -> Iterator[str]:
+    return SELF_CONSISTENCY_BUILDER.iter_chunks(dialogues_batch, max_chars)
 
 
-        Your task is to evaluate a target dialogue transcript using six well-defined criteria.
-        Each criterion must be assigned a discrete score from the set {{20, 40, 60, 80, 100}}, based on explicit evidence in the dialogue. And give an overall score for each dialogue in the end inside <score> tags (example <score>52</score>). Must have <score> tag for EACH dialogue in the batch.
+def get_user_prompting_self_consistency (dialogues_batch: Iterable[str], max_chars: int = MAX_DIALOGUE_CHARS) -> str:
+    return SELF_CONSISTENCY_BUILDER.build(dialogues_batch, max_chars)
 
-        Help me evaluate batch of 10 dialogues. You Must have <score> tag for EACH dialogue in the batch. Your response should be a single JSON and score inside <score> tags. There are transcripts of dialogues below.
-        ``` text
-        {{dialogues_text}}
-        ```
 
+def get_user_prompting_self_consistency_bytes(dialogues_batch: Iterable[str], max_chars: int = MAX_DIALOGUE_CHARS) -> bytes:
+    return SELF_CONSISTENCY_BUILDER.build_bytes(dialogues_batch, max_chars)
 
-        The evaluation proceeds in three sequential steps:
-        1. **Evaluator (Agent A)** — Provides initial scoring with short, evidence-based justifications.
-        2. **Critic (Agent B)** — Reviews and flags any disagreement, proposes corrections with cited evidence.
-        3. **Referee (Agent C)** — Resolves conflicts deterministically using rules, produces final decision and audit trail.
 
+# Kept in a text file so prompt edits do not touch Python source; the
+# dialogues are appended after it, so no placeholder is needed.
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent_debate_prompt.txt"), encoding="utf-8") as _f:
+    _AGENT_DEBATE_PREFIX = _canonical_prefix(_f.read())
+_AGENT_DEBATE_FULL_BUILDER = PromptBuilder(
+    _AGENT_DEBATE_PREFIX, sha256="3aa64bf3f3bd3baa098a597f73cae04f0e4d57d97c4b55af78345280855719a7"
+)
 
-        Evaluation Criteria and Weights
+_sections = re.match(
+    r"(?P<head>.*?\n)(?P<heading>Few-shot learning\n\n\n)(?P<examples>Example A:.*?</score>\n\n\n)(?P<tail>Help me evaluate.*)",
+    _AGENT_DEBATE_PREFIX,
+    re.S,
+)
+if _sections is None:
+    raise ValueError("agent_debate_prompt.txt no longer has the expected few-shot layout")
+_AGENT_DEBATE_SECTIONS: Match[str] = _sections
+_AGENT_DEBATE_EXAMPLES = re.split(r"(?=^Example [A-Z]:$)", _AGENT_DEBATE_SECTIONS["examples"], flags=re.M)[1:]
+# Examples kept as n_fewshot grows: C (dialogue 26, the weakest and hardest to
+# score) first, then A (335) and B (25). They stay in file order in the prompt.
+_AGENT_DEBATE_FEWSHOT_PRIORITY = (2, 0, 1)
+AGENT_DEBATE_FEWSHOT = 1
 
 
-        | Criterion       | Description                                                                                  | Weight |
-        |-----------------|----------------------------------------------------------------------------------------------|---------|
-        | TaskSuccess     | Did the system achieve the user’s goal / answer correctly / elicit correct information?       | 0.40 |
-        | Helpfulness     | Did the system provide sufficient, actionable, or detailed information?                       | 0.15 |
-        | Accuracy        | Are facts correct (no hallucination or false claim)?                                         | 0.15 |
-        | Understanding   | Did the system correctly understand user intent, with minimal clarification needed?          | 0.10 |
-        | Empathy         | Does the system show politeness, human-like care, or emotional awareness?                    | 0.10 |
-        | Fluency         | Are responses grammatically clear, coherent, and natural?                                   | 0.10 |
+def _agent_debate_prefix(n_fewshot: int) -> str:
+    chosen = sorted(_AGENT_DEBATE_FEWSHOT_PRIORITY[:n_fewshot])
+    examples = "".join(_AGENT_DEBATE_EXAMPLES[i] for i in chosen)
+    heading = _AGENT_DEBATE_SECTIONS["heading"] if examples else ""
+    return _AGENT_DEBATE_SECTIONS["head"] + heading + examples + _AGENT_DEBATE_SECTIONS["tail"]
 
 
+_AGENT_DEBATE_BUILDERS = tuple(
+    _AGENT_DEBATE_FULL_BUILDER if n == len(_AGENT_DEBATE_EXAMPLES) else PromptBuilder(_agent_debate_prefix(n))
+    for n in range(len(_AGENT_DEBATE_EXAMPLES) + 1)
+)
+AGENT_DEBATE_BUILDER = _AGENT_DEBATE_BUILDERS[AGENT_DEBATE_FEWSHOT]
 
 
-        Scoring Scale
+def _agent_debate_builder(n_fewshot: int) -> PromptBuilder:
+    if not 0 <= n_fewshot < len(_AGENT_DEBATE_BUILDERS):
+        raise ValueError(f"n_fewshot must be between 0 and {len(_AGENT_DEBATE_BUILDERS) - 1}, got {n_fewshot}")
+    return _AGENT_DEBATE_BUILDERS[n_fewshot]
 
 
-        | Score | Interpretation |
-        |--------|----------------|
-        | 100 | Fully meets criterion. |
-        | 80 | Minor issue, but mostly meets criterion. |
-        | 60 | Partial success or incomplete satisfaction. |
-        | 40 | Major deficiencies, some minimal relevance. |
-        | 20 | Fails completely or contradicts purpose. |
+def iter_user_prompting_agent_debate(
+    dialogues_batch: Iterable[str],
+    max_chars: int = MAX_DIALOGUE_CHARS,
+    n_fewshot: int = AGENT_DEBATE_FEWSHOT,
+) -> Iterator[str]:
+    return _agent_debate_builder(n_fewshot).iter_chunks(dialogues_batch, max_chars)
 
 
+def get_user_prompting_agent_debate(
+    dialogues_batch: Iterable[str],
+    max_chars: int = MAX_DIALOGUE_CHARS,
+    n_fewshot: int = AGENT_DEBATE_FEWSHOT,
+) -> str:
+    return _agent_debate_builder(n_fewshot).build(dialogues_batch, max_chars)
 
 
-        OverallExperience Rule
+def get_user_prompting_agent_debate_from_text(dialogues_text: str, n_fewshot: int = AGENT_DEBATE_FEWSHOT) -> str:
+    return _agent_debate_builder(n_fewshot).build_from_text(dialogues_text)
 
 
-        After scoring six criteria and applying weights:
+def get_user_prompting_agent_debate_bytes(
+    dialogues_batch: Iterable[str],
+    max_chars: int = MAX_DIALOGUE_CHARS,
+    n_fewshot: int = AGENT_DEBATE_FEWSHOT,
+) -> bytes:
+    return _agent_debate_builder(n_fewshot).build_bytes(dialogues_batch, max_chars)
 
 
-        **Weighted Average = (Σ score × weight)**  
+# Builders whose static prefix token counts static_tokens() reports, so a
+# caller can size a batch to the model context before sending it.
+_STATIC_TOKEN_BUILDERS: Dict[str, PromptBuilder] = {
+    "baseline": BASELINE_BUILDER,
+    "barem": BAREM_BUILDER,
+    "self_consistency": SELF_CONSISTENCY_BUILDER,
+    "agent_debate": AGENT_DEBATE_BUILDER,
+}
 
 
-        Then map to `OverallExperience` as follows:  
-        - [100] → if ≥100  
-        - [80] → if 80 ≤ avg < 100  
-        - [60] → if 60 ≤ avg < 80  
-        - [40] → if 40 ≤ avg < 60  
-        - [20] → if < 40  
+def static_tokens(name: str) -> int:
+    """Token count of a prompt variant's static prefix ("baseline", "barem", "self_consistency", "agent_debate").
 
+    Counted on first call per variant, since counting is what loads tiktoken.
+    """
+    builder = _STATIC_TOKEN_BUILDERS.get(name)
+    if builder is None:
+        raise ValueError(f"unknown prompt variant {name!r}; expected one of {sorted(_STATIC_TOKEN_BUILDERS)}")
+    return builder.prefix_tokens
 
-        Example:  
-        If numeric average = **90.7**, round **down to 80**.  
-        If average = **78.5**, round **down to 60**.
 
+def remaining_budget(model_ctx: int, static_tokens: Optional[int] = None) -> int:
+    if static_tokens is None:
+        static_tokens = BASELINE_BUILDER.prefix_tokens
+    return model_ctx - static_tokens
+
+
+# Whitespace runs other than line breaks (spaces, tab runs, NBSPs).
+_INLINE_SPACE_RE = re.compile(r"[^\S\n]+")
+
+
+def normalize_dialogue(text: str) -> str:
+    """Canonical form of a transcript: NFC Unicode, \\n line ends, single inner spaces, no edge spaces.
+
+    Apply it once where dialogues enter the pipeline, so deduplication and the
+    response cache see re-spaced copies as the same dialogue.
+    """
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n")
+    return "\n".join(_INLINE_SPACE_RE.sub(" ", line).strip() for line in text.split("\n"))
 
-        ---
-
-
-        Output expectations:
-
-        ```text
-        {{
-        "dialogue_id": <int>,
-        "evaluator": {{
-            "TaskSuccess": {{"score": <20|40|60|80|100>, "justification": "<1-sentence citing dialogue>"}},
-            "Helpfulness": {{"score": ..., "justification": "..."}},
-            "Accuracy": {{"score": ..., "justification": "..."}},
-            "Understanding": {{"score": ..., "justification": "..."}},
-            "Empathy": {{"score": ..., "justification": "..."}},
-            "Fluency": {{"score": ..., "justification": "..."}},
-            "numeric_weighted_average": <float>
-        }},
-        "critic": [
-            {{"criterion":"TaskSuccess","agree":true|false,"comment":"<if disagree, 1-line reason quoting dialogue>","suggested_score":<number|null>}},
-            ...
-        ],
-        "referee_final": {{
-            "TaskSuccess": {{"score": <final score>, "justification": "<1-sentence citing dialogue>"}},
-            "Helpfulness": {{...}},
-            "Accuracy": {{...}},
-            "Understanding": {{...}},
-            "Empathy": {{...}},
-            "Fluency": {{...}},
-            "numeric_weighted_average": <float>,
-            "OverallExperience": <20|40|60|80|100>
-        }},
-        "audit": {{
-            "decision_rules_applied": "<which critic suggestions accepted and why>",
-            "evidence_used": ["<speaker: quoted line>", "..."],
-            "weighted_calc": "TaskSuccess*0.40 + Helpfulness*0.15 + Accuracy*0.15 + Understanding*0.10 + Empathy*0.10 + Fluency*0.10 = <value>",
-            "mapping_rule": "round down to nearest bucket, e.g. 90→80, 79→60"
-        }}
-        }}
-        <score>...</score>
-        ```
-
-
-        Multi agent debate rules
-
-
-        Agent A (Evaluator)
-        - Gives initial scores for all 6 criteria.
-        - Each justification must quote at least one specific utterance (e.g. USER: "I liked the story").
-        - Include numeric weighted average.
-
-
-        Agent B (Critic)
-        For each criterion: agree/disagree.
-        - If agree=false, must cite exact contradictory or missing evidence, and propose a new score.
-        - Do not change unless there is strong evidence.
-
-
-        Agent C (Referee)
-        Deterministic resolution:
-        - Accept Critic’s suggestion if evidence explicitly contradicts Evaluator’s justification.
-        - Keep Evaluator’s score if Critic gives ambiguous reasoning.
-        - If ≥3 criteria disagreed and Critic provides evidence for all, adopt Critic’s version.
-        - Compute final numeric weighted average and OverallExperience using round-down rule.
-        - Output audit section explaining rules applied and evidence cited.
-
-
-        Few-shot learning
-        SYSTEM            Can you tell me what types of movies you like?            OTHER
-        USER  I really like comedies.   ENTITY_NAME+MOVIE_GENRE_OR_CATEGORY             3,3,3,4
-        SYSTEM            ok, why do you like comedies? OTHER
-        USER  I like to laugh. I like the lightheartedness of it, you know, nothing too serious, a true escape from everyday life. And just puts you in a good mood, and that's how I would prefer to be.   ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY           3,3,3,4
-        SYSTEM            got it, can you name a specific movie you really liked?             OTHER
-        USER  Sure, Best in Show is one of my absolute favorites.             ENTITY_NAME+MOVIE_OR_SERIES     3,3,5,5
-        SYSTEM            ok, why do you like that movie?             OTHER
-        USER  Oh gosh. It's like I'ts perfect. It's a mockumentary style film and they are mocking the dog show world. So, the dog show world that they show is like a carbon copy of the real thing because it's inherently funny, so they don't have to really max with it. And a lot of the player they it there's a script for the movie but it's also ad libed.            ENTITY_OTHER+MOVIE_OR_SERIES  3,3,4,3
-        USER  It's just hilarious. It's so original.            ENTITY_PREFERENCE+MOVIE_OR_SERIES     3,3,3,4
-        USER  So much, so different, and just so funny. It makes you laugh every time you watch it.           ENTITY_PREFERENCE+MOVIE_OR_SERIES     3,3,3,4
-        SYSTEM            ok, would you say you enjoy satire?             ENTITY_NAME+MOVIE_GENRE_OR_CATEGORY          
-        USER  Yeah. OTHER 3,3,4,4
-        SYSTEM            ok, can you name a film you dislike?  OTHER
-        USER  Sure, Bounty Hunter.  ENTITY_NAME+MOVIE_OR_SERIES     3,3,3,4
-        SYSTEM            why didn't you like that movie?             OTHER
-        USER  It was supposed to be a comedy, and not only was it not funny, it was confusing what they were going for. I think it was miscast.             ENTITY_PREFERENCE+MOVIE_OR_SERIES     3,3,2,3
-        USER  It's Jennifer Aniston and I can't even think of his name, but somebody who I don't really care for. But I do like Jennifer usually, and it wasn't a good fit for her. Neither role really fit the actor, like they were sort of playing against type in both roles. I think it was kind of supposed to be almost like a almost like a buddy comedy, but or Cuz it was really focused on two people, but not really buddies, but they were in conflict. It wasn't funny.   ENTITY_PREFERENCE+PERSON          3,3,2,3
-        USER  It kind of had like a more dramatic feel to it because it wasn't funny. It was just It was odd. Really.           ENTITY_PREFERENCE+MOVIE_OR_SERIES     4,4,2,4
-        SYSTEM            was the acting bad?   OTHER
-        USER  It wasn't great. It was not great.            ENTITY_PREFERENCE+MOVIE_OR_SERIES     3,3,2,2
-        SYSTEM            ok, can you tell me have you watched the movie the shawshank redemption?    ENTITY_NAME+MOVIE_OR_SERIES    
-        USER  Oh, yes.            OTHER 3,3,3,3
-        SYSTEM            do you like that movie?             OTHER
-        USER  It's a excellent movie.   ENTITY_PREFERENCE+MOVIE_OR_SERIES     3,3,3,5
-        SYSTEM            ok, what about the movie did you enjoy?         OTHER
-        USER  It really has a different feel to it. It's despite them being, you know, prisoners, they create very endearing characters who you rooting for, who you want to see have a better life. It is a You're transported to a different time so you can sort of capture what was going on better.    ENTITY_PREFERENCE+MOVIE_OR_SERIES     3,3,3,5
-        USER  It very moving, it very and and it's very touching which usually does not happen with something that's sort of a prison drama. I don't you ever really view them as true prisoners some of whom shouldn't really have gotten as steep of sentences as they do or like somebody who walks who was there far too long for what it sounded like he was in for and then couldn't live in the real world having been locked up so long. So, it's it's it's a it's just a it's a excellent film.      ENTITY_PREFERENCE+MOVIE_OR_SERIES             3,3,3,5
-        USER  with amazing acting, wonderful direction and it's just It's very special. It it really is. It's it's one of those wonder you look back and you wonder why didn't want to win Oscar.  ENTITY_PREFERENCE+MOVIE_OR_SERIES      3,3,5,5
-        USER  OVERALL         OTHER 4,4,5,4
-        Expected output:
-        ```text
-        {{
-        "dialogue_id": 335,
-        "evaluator": {{
-            "TaskSuccess": {{"score": 100, "justification": "SYSTEM successfully elicited full user preferences and examples ('Best in Show')."}},
-            "Helpfulness": {{"score": 100, "justification": "SYSTEM guided user to elaborate reasons and examples effectively."}},
-            "Accuracy": {{"score": 100, "justification": "No factual inconsistencies or hallucinated content."}},
-            "Understanding": {{"score": 100, "justification": "All turns were coherent and contextually relevant."}},
-            "Empathy": {{"score": 80, "justification": "Polite and engaging but lacked explicit empathy phrases."}},
-            "Fluency": {{"score": 100, "justification": "Dialogue is natural and coherent."}},
-            "numeric_weighted_average": 98.00
-        }},
-        "critic": [
-            {{"criterion": "Empathy", "agree": false, "comment": "SYSTEM polite but not emotionally expressive (no acknowledgment like 'That sounds fun!').", "suggested_score": 80}}
-        ],
-        "referee_final": {{
-            "TaskSuccess": {{"score": 100, "justification": "Goal fully achieved — user provided detailed movie preference."}},
-            "Helpfulness": {{"score": 100, "justification": "Agent prompted multiple elaborations."}},
-            "Accuracy": {{"score": 100, "justification": "All factual and contextually correct."}},
-            "Understanding": {{"score": 100, "justification": "No misunderstanding detected."}},
-            "Empathy": {{"score": 80, "justification": "Neutral politeness without explicit empathy."}},
-            "Fluency": {{"score": 100, "justification": "Language fluid and natural."}},
-            "numeric_weighted_average": 98.00,
-            "OverallExperience": 80
-        }},
-        "audit": {{
-            "decision_rules_applied": "Critic’s empathy reduction accepted (valid evidence, tone neutral).",
-            "evidence_used": ["SYSTEM: 'got it, can you name...'", "USER: 'Sure, Best in Show...'"],
-            "weighted_calc": "100*0.40 + 100*0.15 + 100*0.15 + 100*0.10 + 80*0.10 + 100*0.10 = 98.00",
-            "mapping_rule": "round down 98 → 80"
-        }}
-        }}
-        <score>98</score>
-        ```
-
-
-        Example B:
-
-
-        SYSTEM            What kinds of movies do you like?       OTHER
-        USER  I really like action movies.            ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY           3,3,4
-        USER  Like superhero movies.            ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY           3,3,4
-        SYSTEM            Why do you like action movies?            ENTITY_NAME+MOVIE_GENRE_OR_CATEGORY          
-        USER  They're just really fun, energetic. They make me feel like, you know, I can be an action star, too. See lots of cool stunts, and usually lots of unique and cool locations.             ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY           4,3,4
-        SYSTEM            Alright, how about a movie you liked?  OTHER
-        USER  I really liked Transporter.         ENTITY_NAME+MOVIE_OR_SERIES     3,3,5
-        SYSTEM            Why did you like that movie?  OTHER
-        USER  There's a lot of really cool stunts and a lot of awesome action scenes really like heart pounding excitement.     ENTITY_PREFERENCE+MOVIE_OR_SERIES     4,3,4
-        SYSTEM            Well, is there a movie you did not like? OTHER
-        USER  That action movie I didn't like. Hardcore Henry, I didn't like. I really didn't like the first person and it's just seem like a really tough violent for no reason.             ENTITY_NAME+MOVIE_OR_SERIES     3,3,3
-        SYSTEM            Ok, then have you seen the movie John Wick ?            ENTITY_NAME+MOVIE_OR_SERIES    
-        USER  I have. John Wick is awesome. ENTITY_OTHER+MOVIE_OR_SERIES  3,4,4
-        SYSTEM            Why did you like John Wick?   ENTITY_NAME+MOVIE_OR_SERIES    
-        USER  The story is really good. The characters are awesome, and there's a lot of cool themes in the movie.  ENTITY_PREFERENCE+MOVIE_OR_SERIES     4,4,3
-        SYSTEM            Ok, thank you for sharing. Good bye.  OTHER
-        USER  OVERALL         OTHER 4,4,4
-
-
-        Expected output:
-        ```text
-        {{
-        "dialogue_id": 25,
-        "evaluator": {{
-            "TaskSuccess": {{"score": 100, "justification": "User fully responded to system prompts with correct context and examples."}},
-            "Helpfulness": {{"score": 60, "justification": "Agent collected info but offered no added explanation or context."}},
-            "Accuracy": {{"score": 100, "justification": "No factual errors present."}},
-            "Understanding": {{"score": 100, "justification": "Agent correctly followed user intent and topic."}},
-            "Empathy": {{"score": 40, "justification": "Tone neutral and mechanical, no signs of empathy."}},
-            "Fluency": {{"score": 100, "justification": "Utterances fluent and grammatically correct."}},
-            "numeric_weighted_average": 86.00
-        }},
-        "critic": [
-            {{"criterion": "Helpfulness", "agree": false, "comment": "Agent could have elaborated on user’s answers (e.g., 'That’s a great action movie!').", "suggested_score": 60}},
-            {{"criterion": "Empathy", "agree": false, "comment": "No softening or engaging phrases.", "suggested_score": 40}}
-        ],
-        "referee_final": {{
-            "TaskSuccess": {{"score": 100, "justification": "User gave full answers for all prompts."}},
-            "Helpfulness": {{"score": 60, "justification": "Agent did not enrich dialogue or offer related suggestions."}},
-            "Accuracy": {{"score": 100, "justification": "Factually correct content."}},
-            "Understanding": {{"score": 100, "justification": "Maintained topic and sequence properly."}},
-            "Empathy": {{"score": 40, "justification": "Completely neutral tone without affective language."}},
-            "Fluency": {{"score": 100, "justification": "Natural phrasing and flow."}},
-            "numeric_weighted_average": 86.00,
-            "OverallExperience": 80
-        }},
-        "audit": {{
-            "decision_rules_applied": "Critic’s Helpfulness and Empathy adjustments accepted.",
-            "evidence_used": ["SYSTEM: 'Why did you like that movie?'", "USER: 'There’s a lot of really cool stunts...'"],
-            "weighted_calc": "100*0.40 + 60*0.15 + 100*0.15 + 100*0.10 + 40*0.10 + 100*0.10 = 86.00",
-            "mapping_rule": "round down 86 → 80"
-        }}
-        }}
-        <score>80</score>
-        ```
-
-
-        Example C:
-
-
-        SYSTEM            What type of movies do you enjoy?     OTHER
-        USER  I like movies that are based on true story.             ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY           3,3,3
-        SYSTEM            What appeals to you with these type of movies?          OTHER
-        USER  I think it's just easier to get invested in the story knowing it's at least partially true, so it feels more real, like you can get more invested in the characters.            ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY           3,4,3
-        SYSTEM            Is there a specific movie you enjoy from this genre?  OTHER
-        USER  I watched Apollo 13 recently, and that's a really good movie.             ENTITY_OTHER+MOVIE_OR_SERIES  3,3,3
-        SYSTEM            What did you like about this movie?   OTHER
-        USER  I've always liked space travel, like it's just an interesting idea, and so seeing the story of how their mission went wrong and how they got back was just really fascinating.            ENTITY_PREFERENCE+MOVIE_OR_SERIES     4,4,3
-        SYSTEM            Are there any type of movies that you don't enjoy?      OTHER
-        USER  I don't like comic book movies very much.             ENTITY_PREFERENCE+MOVIE_OR_SERIES     2,3,3
-        SYSTEM            What about these movies is unappealing?     OTHER
-        USER  There's just too many of them. Like I fell behind, and I've never felt like catching back up, so I just tend to ignore all of them, and they just generally don't interest me that much.   ENTITY_PREFERENCE+MOVIE_GENRE_OR_CATEGORY          3,2,3
-        SYSTEM            Is there a specific movie that you heavily dislike?       OTHER
-        USER  The movie I didn't like Available. I saw that recently, I didn't like that movie.             ENTITY_OTHER+MOVIE_OR_SERIES  3,2,3
-        SYSTEM            What do you dislike about this movie? OTHER
-        SYSTEM            Have you seen Armageddon  OTHER
-        USER  No.     ENTITY_OTHER+MOVIE_OR_SERIES  1,1,3
-        SYSTEM            How about the Incredibles 2   ENTITY_NAME+MOVIE_OR_SERIES    
-        USER  Nope, haven't seen that.          ENTITY_OTHER+MOVIE_OR_SERIES  2,1,2
-        USER  OVERALL         OTHER 2,2,2
-
-        Expected output:
-        ```text
-
-        {{
-        "dialogue_id": 26,
-        "evaluator": {{
-            "TaskSuccess": {{"score": 80, "justification": "System guided user successfully but conversation depth limited."}},
-            "Helpfulness": {{"score": 60, "justification": "Agent gathered info but did not elaborate or connect ideas."}},
-            "Accuracy": {{"score": 100, "justification": "All facts correct."}},
-            "Understanding": {{"score": 80, "justification": "Agent followed intent but responses were short."}},
-            "Empathy": {{"score": 60, "justification": "Tone polite but emotionally flat."}},
-            "Fluency": {{"score": 80, "justification": "Minor repetitions but understandable."}},
-            "numeric_weighted_average": 78.00
-        }},
-        "critic": [
-            {{"criterion": "TaskSuccess", "agree": true, "comment": "Accurate assessment."}},
-            {{"criterion": "Helpfulness", "agree": false, "comment": "Could lower further; agent offered no detail or follow-up guidance.", "suggested_score": 60}},
-            {{"criterion": "Empathy", "agree": false, "comment": "No warmth or acknowledgment of user’s enjoyment.", "suggested_score": 60}}
-        ],
-        "referee_final": {{
-            "TaskSuccess": {{"score": 80, "justification": "User provided correct answers but limited detail."}},
-            "Helpfulness": {{"score": 60, "justification": "System did not expand user’s statements."}},
-            "Accuracy": {{"score": 100, "justification": "No hallucinations or factual errors."}},
-            "Understanding": {{"score": 80, "justification": "Maintained context logically."}},
-            "Empathy": {{"score": 60, "justification": "Polite but impersonal."}},
-            "Fluency": {{"score": 80, "justification": "Generally fluent, slightly repetitive."}},
-            "numeric_weighted_average": 78.00,
-            "OverallExperience": 60
-        }},
-        "audit": {{
-            "decision_rules_applied": "Critic’s feedback accepted partially (Empathy and Helpfulness).",
-            "evidence_used": ["USER: 'I watched Apollo 13 recently...'", "SYSTEM: 'What did you like about this movie?'"],
-            "weighted_calc": "80*0.40 + 60*0.15 + 100*0.15 + 80*0.10 + 60*0.10 + 80*0.10 = 78.00",
-            "mapping_rule": "round down 78 → 60"
-        }}
-        }}
-        <score>60</score>
-        ```
 
+def dedupe_dialogues(
+    dialogues_batch: Iterable[str], key: Optional[Callable[[str], Any]] = None
+) -> Tuple[List[str], List[int]]:
+    """Return the distinct dialogues in first-seen order, and for each input position its index among them.
 
+    With `key`, dialogues with equal keys (e.g. a whitespace-insensitive digest)
+    count as one, and the first of them is kept.
+    """
+    positions: Dict[Any, int] = {}
+    unique: List[str] = []
+    order: List[int] = []
+    for dialogue in dialogues_batch:
+        dialogue_id = dialogue if key is None else key(dialogue)
+        idx = positions.get(dialogue_id)
+        if idx is None:
+            idx = positions[dialogue_id] = len(unique)
+            unique.append(dialogue)
+        order.append(idx)
+    return unique, order
+
+
+def expand_results(unique_results: Sequence[Any], order: Sequence[int]) -> List[Any]:
+    """Fan per-unique-dialogue results back out to the original batch positions."""
+    return [unique_results[idx] for idx in order]
+
+
+# Prompts built ahead of the one being sent; about the number of LLM requests in flight.
+PREFETCH_PROMPTS = 4
+
+
+def prefetch_prompts(
+    dialogue_batches: Iterable[Sequence[str]],
+    build: Callable[[Sequence[str]], Any] = get_user_prompting_agent_debate,
+    ahead: int = PREFETCH_PROMPTS,
+) -> Iterator[Any]:
+    """Yield build(batch) for each batch, in order, with the next `ahead` prompts built on worker threads.
+
+    The caller's LLM request releases the GIL while it waits on the network, so
+    the following prompts are ready by the time it asks for them.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=ahead) as executor:
+        pending: Deque["concurrent.futures.Future[Any]"] = collections.deque()
+        for batch in dialogue_batches:
+            pending.append(executor.submit(build, batch))
+            if len(pending) > ahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# Every prompt asks for one <score>N</score> per dialogue. Both forms are kept so
+# a raw HTTP body can be parsed without decoding it first.
+_SCORE_RE = re.compile(r"<score>\s*(\d+)\s*</score>")
+_SCORE_RE_B = re.compile(rb"<score>\s*(\d+)\s*</score>")
+_DIALOGUE_SECTION_RE = re.compile(r"^\W*Dialogue\s+(\d+)\b", re.M)
+_DIALOGUE_SECTION_RE_B = re.compile(rb"^\W*Dialogue\s+(\d+)\b", re.M)
+
+
+def parse_scores(response: Any, expected: Optional[int] = None) -> List[Optional[int]]:
+    """Scores from the <score> tags of an LLM response (str or bytes), in order.
+
+    When `expected` is given and the tag count does not match it, scores are
+    recovered per dialogue from the "Dialogue N" headers the model echoed, with
+    None for any dialogue that has no score.
     """
-    
-    return prompt
\ No newline at end of file
+    if isinstance(response, bytearray):
+        response = bytes(response)
+    if isinstance(response, bytes):
+        return _parse_scores(response, _SCORE_RE_B, _DIALOGUE_SECTION_RE_B, expected)
+    return _parse_scores(response, _SCORE_RE, _DIALOGUE_SECTION_RE, expected)
+
+
+def _parse_scores(
+    response: AnyStr, score_re: Pattern[AnyStr], section_re: Pattern[AnyStr], expected: Optional[int]
+) -> List[Optional[int]]:
+    scores: List[Optional[int]] = [int(s) for s in score_re.findall(response)]
+    if expected is None or len(scores) == expected:
+        return scores
+
+    recovered: List[Optional[int]] = [None] * expected
+    headers = list(section_re.finditer(response))
+    for i, header in enumerate(headers):
+        idx = int(header.group(1)) - 1
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(response)
+        found = score_re.search(response, header.end(), end)
+        if found and 0 <= idx < expected and recovered[idx] is None:
+            recovered[idx] = int(found.group(1))
+    return recovered
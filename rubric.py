@@ -0,0 +1,153 @@
+import json
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:  # optional: fall back to the NumPy functions below
+    njit = None
+
+# Criteria in the barem's order, and their OverallExperience weights in percent.
+# Integer weights keep the dot product exact, so an average that lands on a
+# bucket edge (e.g. 80) is never rounded down past it. int16 is enough: an int8
+# score row dotted with them stays below 127 * 100.
+CRITERIA = ("TaskSuccess", "Helpfulness", "Accuracy", "Understanding", "Empathy", "Fluency")
+WEIGHTS_PERCENT = np.array([40, 15, 15, 10, 10, 10], dtype=np.int16)
+
+# Structured-output (JSON mode) schema for one dialogue: the six criteria and
+# OverallExperience as bare integers, with no justifications or <score> tag to
+# generate. Pass it as OpenAI's response_format json_schema (strict) or as
+# Gemini's response_json_schema with response_mime_type="application/json".
+RUBRIC_SCHEMA = {
+    "type": "object",
+    "properties": {name: {"type": "integer"} for name in CRITERIA + ("OverallExperience",)},
+    "required": list(CRITERIA + ("OverallExperience",)),
+    "additionalProperties": False,
+}
+
+# Stored for a criterion the response did not score, or scored outside the rubric
+# range; rows holding it get no weighted average and no OverallExperience
+MISSING_SCORE = -1
+SCORE_RANGE = (0, 100)
+
+# OverallExperience buckets from the barem; the weighted average rounds down to
+# the nearest one, and anything below 40 maps to 20
+OVERALL_BUCKETS = np.array([20, 40, 60, 80, 100], dtype=np.int64)
+
+
+def overall_experience(weighted_averages) -> np.ndarray:
+    """Map weighted averages to OverallExperience buckets, rounding down (78.5 -> 60, 90.7 -> 80).
+
+    NaN (see weighted_average) maps to MISSING_SCORE.
+    """
+    averages = np.asarray(weighted_averages, dtype=np.float64)
+    # Index of the largest bucket <= average, clamped to the lowest bucket
+    idx = np.searchsorted(OVERALL_BUCKETS, averages, side='right') - 1
+    # NaN (a row with a missing criterion) has no bucket
+    return np.where(np.isnan(averages), MISSING_SCORE, OVERALL_BUCKETS[np.maximum(idx, 0)])
+
+
+def weighted_average(criterion_scores) -> np.ndarray:
+    """Weighted averages of an (N, 6) array of criterion scores (columns in CRITERIA order).
+
+    Scores are held as int8 and accumulated in int16 against the percent weights.
+    Rows with a MISSING_SCORE criterion average to NaN rather than counting it as -1.
+    """
+    scores = np.asarray(criterion_scores, dtype=np.int8)
+    averages = (scores.astype(np.int16) @ WEIGHTS_PERCENT) / 100
+    return np.where((scores == MISSING_SCORE).any(axis=-1), np.nan, averages)
+
+
+_DECODER = json.JSONDecoder()
+
+
+def _criteria_block(response: str) -> Dict:
+    """The per-criterion object of a response's first JSON object, or {} when there is none.
+
+    Braces that do not open a JSON object (e.g. the barem's "{20,40,60,80,100}"
+    echoed in the reasoning) are skipped.
+    """
+    start = response.find("{")
+    while start != -1:
+        try:
+            obj, _ = _DECODER.raw_decode(response, start)
+        except ValueError:
+            obj = None
+        if isinstance(obj, dict):
+            # Agent-debate responses carry the settled scores under referee_final
+            final = obj.get("referee_final")
+            return final if isinstance(final, dict) else obj
+        start = response.find("{", start + 1)
+    return {}
+
+
+def _valid_score(score) -> bool:
+    """A whole number (int, or integral float) within SCORE_RANGE; anything else is left missing."""
+    if isinstance(score, bool) or not isinstance(score, (int, float)):
+        return False
+    return score == int(score) and SCORE_RANGE[0] <= score <= SCORE_RANGE[1]
+
+
+def parse_criterion_scores(
+    responses: Sequence[str], with_justifications: bool = False
+) -> Tuple[np.ndarray, Optional[List[Tuple[str, ...]]]]:
+    """Criterion scores of N responses as an (N, 6) int8 array (columns in CRITERIA order).
+
+    Criteria may be {"score": N, "justification": ...} objects, as in the prompts'
+    exemplars, or bare integers from a RUBRIC_SCHEMA response. A score that is
+    absent, fractional or outside SCORE_RANGE is stored as MISSING_SCORE.
+    Justifications are only collected when asked for, one tuple per response
+    ("" when absent).
+    """
+    scores = np.full((len(responses), len(CRITERIA)), MISSING_SCORE, dtype=np.int8)
+    justifications: Optional[List[Tuple[str, ...]]] = [] if with_justifications else None
+    for i, response in enumerate(responses):
+        block = _criteria_block(response)
+        entries = [block.get(name) for name in CRITERIA]
+        for j, entry in enumerate(entries):
+            score = entry.get("score") if isinstance(entry, dict) else entry
+            if _valid_score(score):
+                scores[i, j] = score
+        if justifications is not None:
+            justifications.append(tuple(
+                str(entry.get("justification", "")) if isinstance(entry, dict) else "" for entry in entries
+            ))
+    return scores, justifications
+
+
+if njit is not None:
+    # Compiled at import for the one signature used, so the first batch pays no JIT cost
+    @njit("void(int8[:, ::1], int16[::1], int64[::1], int64[::1])", parallel=True, cache=True)
+    def _overall_kernel(scores, weights_percent, buckets, out):
+        for i in prange(scores.shape[0]):
+            total = 0
+            missing = False
+            for j in range(scores.shape[1]):
+                if scores[i, j] == MISSING_SCORE:
+                    missing = True
+                total += scores[i, j] * weights_percent[j]
+            if missing:
+                out[i] = MISSING_SCORE
+                continue
+            # total is the weighted average x100; keep the largest bucket it reaches
+            overall = buckets[0]
+            for bucket in buckets:
+                if total >= bucket * 100:
+                    overall = bucket
+            out[i] = overall
+else:
+    _overall_kernel = None
+
+
+def overall_from_scores(criterion_scores) -> np.ndarray:
+    """OverallExperience buckets straight from an (N, 6) array of criterion scores, in one pass.
+
+    Rows with a MISSING_SCORE criterion get MISSING_SCORE.
+    """
+    if _overall_kernel is None:
+        return overall_experience(weighted_average(criterion_scores))
+    scores = np.ascontiguousarray(criterion_scores, dtype=np.int8)
+    out = np.empty(scores.shape[0], dtype=np.int64)
+    _overall_kernel(scores, WEIGHTS_PERCENT, OVERALL_BUCKETS, out)
+    return out
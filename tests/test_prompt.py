@@ -0,0 +1,121 @@
+import unittest
+
+import prompt
+
+# Past the 256 preformatted headers, so the fallback formatting is covered too
+_BATCH_SIZES = (1, 3, 300)
+
+_BUILDERS = {
+    "baseline": prompt.get_user_prompt_baseline,
+    "barem": prompt.get_user_prompt_barem,
+    "self_consistency": prompt.get_user_prompting_self_consistency,
+    "agent_debate": prompt.get_user_prompting_agent_debate,
+}
+_BYTES_BUILDERS = {
+    "baseline": prompt.get_user_prompt_baseline_bytes,
+    "barem": prompt.get_user_prompt_barem_bytes,
+    "self_consistency": prompt.get_user_prompting_self_consistency_bytes,
+    "agent_debate": prompt.get_user_prompting_agent_debate_bytes,
+}
+
+
+def _batch(n):
+    return ["USER: dialogue %d\nSYSTEM: reply" % i for i in range(1, n + 1)]
+
+
+class DialogueHeaderTest(unittest.TestCase):
+
+    def assert_rendered(self, text, n):
+        self.assertNotIn("{idx}", text)
+        self.assertIn("=== Dialogue %d ===\nUSER: dialogue %d\n" % (n, n), text)
+
+    def test_str_builders(self):
+        for name, build in _BUILDERS.items():
+            for n in _BATCH_SIZES:
+                with self.subTest(builder=name, n=n):
+                    self.assert_rendered(build(_batch(n)), n)
+
+    def test_bytes_builders(self):
+        for name, build in _BYTES_BUILDERS.items():
+            for n in _BATCH_SIZES:
+                with self.subTest(builder=name, n=n):
+                    self.assert_rendered(build(_batch(n)).decode("utf-8"), n)
+
+    def test_iter_chunks_and_from_text(self):
+        for n in _BATCH_SIZES:
+            with self.subTest(n=n):
+                self.assert_rendered("".join(prompt.iter_user_prompt_baseline(_batch(n))), n)
+                text = "".join(prompt._iter_dialogues(_batch(n)))
+                self.assert_rendered(prompt.get_user_prompting_agent_debate_from_text(text), n)
+
+    def test_every_agent_debate_fewshot_count(self):
+        for n_fewshot in range(len(prompt._AGENT_DEBATE_EXAMPLES) + 1):
+            with self.subTest(n_fewshot=n_fewshot):
+                self.assert_rendered(prompt.get_user_prompting_agent_debate(_batch(300), n_fewshot=n_fewshot), 300)
+
+
+def _transcript(n_turns, trailing_newline=True):
+    text = "\n".join("USER\tturn number %d here" % i for i in range(n_turns))
+    return text + "\n" if trailing_newline else text
+
+
+class TruncateDialogueTest(unittest.TestCase):
+
+    def split(self, dialogue, max_chars):
+        """Head, dropped-turn count and tail of a truncated dialogue."""
+        truncated = prompt.truncate_dialogue(dialogue, max_chars)
+        head, marker_and_tail = truncated.split("\n... [truncated ", 1)
+        dropped, tail = marker_and_tail.split(" turns] ...\n", 1)
+        self.assertTrue(dialogue.startswith(head))
+        self.assertTrue(dialogue.endswith(tail))
+        self.assertLessEqual(len(head) + len(tail), max_chars)
+        return head, int(dropped), tail
+
+    def assert_turns_add_up(self, dialogue, max_chars):
+        head, dropped, tail = self.split(dialogue, max_chars)
+        # Partly kept turns count as kept
+        kept = (len(head.split("\n")) if head else 0) + len(tail.splitlines())
+        self.assertEqual(kept + dropped, len(dialogue.splitlines()))
+        return head, dropped, tail
+
+    def test_short_dialogue_is_unchanged(self):
+        dialogue = _transcript(3)
+        self.assertIs(prompt.truncate_dialogue(dialogue, len(dialogue)), dialogue)
+
+    def test_cuts_on_turn_boundaries(self):
+        head, dropped, tail = self.assert_turns_add_up(_transcript(2000), 1000)
+        self.assertTrue(head.endswith(" here"))
+        self.assertTrue(tail.startswith("USER\t"))
+        self.assertGreater(dropped, 0)
+
+    def test_trailing_newline_or_not(self):
+        for trailing_newline in (True, False):
+            for max_chars in (50, 1000):
+                with self.subTest(trailing_newline=trailing_newline, max_chars=max_chars):
+                    self.assert_turns_add_up(_transcript(2000, trailing_newline), max_chars)
+
+    def test_single_giant_turn(self):
+        head, dropped, tail = self.split("x" * 500, 60)
+        self.assertEqual(dropped, 0)
+        self.assertEqual(len(head) + len(tail), 60)
+
+    def test_tiny_max_chars(self):
+        for max_chars in (0, 1, 2, 5):
+            for dialogue in (_transcript(2000), _transcript(2000, False), "x" * 300 + "\n" + "y" * 300):
+                with self.subTest(max_chars=max_chars, dialogue=dialogue[-8:]):
+                    self.assert_turns_add_up(dialogue, max_chars)
+
+
+class StaticTokensTest(unittest.TestCase):
+
+    def test_counts_each_variant_prefix(self):
+        self.assertEqual(prompt.static_tokens("barem"), prompt.BAREM_BUILDER.prefix_tokens)
+        self.assertGreater(prompt.static_tokens("barem"), prompt.static_tokens("baseline"))
+
+    def test_unknown_variant(self):
+        with self.assertRaises(ValueError):
+            prompt.static_tokens("BASELINE_STATIC_TOKENS")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import json
+import unittest
+
+import numpy as np
+
+import rubric
+
+
+def _response(**scores):
+    return json.dumps({name: {"score": score, "justification": ""} for name, score in scores.items()})
+
+
+class CriterionScoresTest(unittest.TestCase):
+
+    def test_out_of_range_and_fractional_scores_are_missing(self):
+        scores, _ = rubric.parse_criterion_scores([_response(
+            TaskSuccess=200, Helpfulness=80.5, Accuracy=80.0, Understanding=-5, Empathy=True, Fluency=60,
+        )])
+        self.assertEqual(scores.tolist(), [[-1, -1, 80, -1, -1, 60]])
+
+    def test_braces_before_the_json_are_skipped(self):
+        response = "Scores must be one of {20,40,60,80,100}.\n" + _response(**{name: 60 for name in rubric.CRITERIA})
+        scores, _ = rubric.parse_criterion_scores([response])
+        self.assertEqual(scores.tolist(), [[60] * len(rubric.CRITERIA)])
+
+    def test_rows_with_missing_criteria_get_no_overall(self):
+        full = _response(**{name: 80 for name in rubric.CRITERIA})
+        partial = _response(**{name: 80 for name in rubric.CRITERIA[:-1]})
+        scores, _ = rubric.parse_criterion_scores([full, partial])
+        averages = rubric.weighted_average(scores)
+        self.assertEqual(averages[0], 80)
+        self.assertTrue(np.isnan(averages[1]))
+        self.assertEqual(rubric.overall_experience(averages).tolist(), [80, rubric.MISSING_SCORE])
+        self.assertEqual(rubric.overall_from_scores(scores).tolist(), [80, rubric.MISSING_SCORE])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+
+import x
+from cache import ResponseCache
+
+
+class ScoreAllTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+
+    async def _generate(self, prompt):
+        self.sent.append(prompt)
+        return "Reasoning... <score>%d</score>" % (40 if "bad" in prompt else 60)
+
+    def _local_scorer(self, dialogue_text):
+        # Confident only about the "good" transcripts
+        return (80, 0.95) if "good" in dialogue_text else (20, 0.5)
+
+    def test_mixed_batch_returns_int_scores_only(self):
+        batch = ["USER: good", "USER: bad", "USER: other", "USER:  good"]
+        scores = asyncio.run(x.score_all(
+            "PREFIX", batch, self._generate,
+            response_cache=ResponseCache(), local_scorer=self._local_scorer,
+        ))
+        self.assertEqual(scores, [80, 40, 60, 80])
+        self.assertTrue(all(isinstance(score, int) for score in scores))
+        # The local scorer's transcript never reaches the LLM; its re-spaced copy is deduped
+        self.assertEqual(len(self.sent), 2)
+
+    def test_transcripts_are_sent_normalized(self):
+        asyncio.run(x.score_all(
+            "PREFIX", ["USER:\t hi  there \r\nSYSTEM: hello "], self._generate, response_cache=ResponseCache(),
+        ))
+        self.assertIn("\nUSER: hi there\nSYSTEM: hello\n", self.sent[0])
+
+    def _streaming(self, pieces):
+        sent = []
+
+        async def generate(prompt):
+            for piece in pieces:
+                sent.append(piece)
+                yield piece
+        return generate, sent
+
+    def test_streamed_and_plain_responses_score_alike(self):
+        text = "A bad example scores <score>20</score>. Final: <score>70</score> done"
+        generate, sent = self._streaming([text[:30], text[30:60], text[60:]])
+
+        async def plain(prompt):
+            return text
+        streamed = asyncio.run(x.score_all("PREFIX", ["USER: hi"], generate, response_cache=ResponseCache()))
+        self.assertEqual(streamed, asyncio.run(x.score_all("PREFIX", ["USER: hi"], plain, response_cache=ResponseCache())))
+        self.assertEqual(streamed, [70])
+        self.assertEqual(len(sent), 3)
+
+    def test_stop_at_score_closes_the_stream(self):
+        generate, sent = self._streaming(["Reasoning... <sco", "re>60</sc", "ore>", " and more", " text"])
+        cache = ResponseCache()
+        scores = asyncio.run(x.score_all("PREFIX", ["USER: hi"], generate, response_cache=cache, stop_at_score=True))
+        self.assertEqual(scores, [60])
+        self.assertEqual(len(sent), 3)
+        self.assertEqual(cache.lookup("USER: hi"), "Reasoning... <score>60</score>")
+
+    def test_failed_request_keeps_the_other_responses(self):
+        async def generate(prompt):
+            self.sent.append(prompt)
+            if "fails" in prompt:
+                raise RuntimeError("429")
+            return "<score>60</score>"
+
+        cache = ResponseCache()
+        batch = ["USER: one", "USER: fails", "USER: two", "USER: three"]
+        with self.assertRaises(RuntimeError):
+            asyncio.run(x.score_all("PREFIX", batch, generate, response_cache=cache))
+        self.assertEqual(len(self.sent), 4)
+        self.assertEqual(len(cache.exact), 3)
+        # A retry only sends the request that failed
+        with self.assertRaises(RuntimeError):
+            asyncio.run(x.score_all("PREFIX", batch, generate, response_cache=cache))
+        self.assertEqual(len(self.sent), 5)
+
+    def test_cache_hits_are_parsed_like_fresh_responses(self):
+        cache = ResponseCache()
+        first = asyncio.run(x.score_all("PREFIX", ["USER: bad"], self._generate, response_cache=cache))
+        second = asyncio.run(x.score_all("PREFIX", ["USER: bad"], self._generate, response_cache=cache))
+        self.assertEqual(first, second)
+        self.assertEqual(second, [40])
+        self.assertEqual(len(self.sent), 1)
+
+    def test_response_without_score_tag_is_none(self):
+        async def generate(prompt):
+            return "no tag"
+        self.assertEqual(asyncio.run(x.score_all("PREFIX", ["USER: hi"], generate, response_cache=ResponseCache())), [None])
+
+
+if __name__ == "__main__":
+    unittest.main()
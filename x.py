@@ -1,16 +1,237 @@
-user_prompt = f"""
-    Please evaluate sctrictly for the following transcript:
-    ```text
-    {dialogue_data[i]}
-    ```
-    Explain your reasoning as if you are a difficult evaluator for customer service dialogues. 
-    Think step by step, and then give an overall score for each dialogue in the end inside <score> (example <52>).
-
-    Examples:
-    - This is a bad dialougue:
-    Overall score negative: {score[1]['score']} : {dialogue[1]['text']}
-    - This is an average dialougue:
-    Overall score negative: {score[0]['score']} : {dialogue[0]['text']}
-    This is a slightly slightly good dialougue:
-    Overall score negative: {score[2]['score']} : {dialogue[2]['text']}
-"""
\ No newline at end of file
+import asyncio
+import functools
+import inspect
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from cache import ResponseCache, dialogue_key
+from prompt import dedupe_dialogues, expand_results, normalize_dialogue, parse_scores
+
+# LLM requests kept in flight at once; the run is bound by round-trips, not CPU.
+MAX_IN_FLIGHT = 16
+
+# Closing score tag; read_until_score stops a streamed response once enough have arrived
+_SCORE_CLOSE = "</score>"
+
+# Local classifier confidence at or above which its score stands without an LLM call
+LOCAL_MIN_CONFIDENCE = 0.9
+
+# Response texts per static prefix, kept for the life of the process (e.g. a
+# notebook session); the same transcript under other reference examples is a new
+# request. Exact (whitespace-insensitive) matches only, never similarity hits.
+_RESPONSE_CACHES: Dict[str, ResponseCache] = {}
+
+# Instructions and the three scored reference dialogues are the same for every
+# transcript, so they lead the prompt and are formatted once per run; only the
+# transcript follows. A provider's prefix cache then covers everything before it.
+_STATIC_PROMPT_TEMPLATE = """\
+Explain your reasoning as if you are a difficult evaluator for customer service dialogues.
+Think step by step, and then give an overall score for each dialogue in the end inside <score> (example <score>52</score>).
+
+Examples:
+- This is a bad dialougue:
+Overall score negative: {bad_score} : {bad_dialogue}
+- This is an average dialougue:
+Overall score negative: {average_score} : {average_dialogue}
+This is a slightly slightly good dialougue:
+Overall score negative: {good_score} : {good_dialogue}
+"""
+
+# Fixed text around the transcript, joined as-is so a call parses no template.
+_TRANSCRIPT_HEAD = """
+Please evaluate sctrictly for the following transcript:
+```text
+"""
+_TRANSCRIPT_TAIL = """
+```
+"""
+
+
+def build_static_prefix(score: Sequence[Dict[str, Any]], dialogue: Sequence[Dict[str, Any]]) -> str:
+    """Instructions plus the reference examples (average, bad, good at indices 0, 1, 2)."""
+    return _format_static_prefix(
+        score[1]['score'], dialogue[1]['text'],
+        score[0]['score'], dialogue[0]['text'],
+        score[2]['score'], dialogue[2]['text'],
+    )
+
+
+# A run uses one set of reference examples, so rebuilding the prefix (e.g. from a
+# re-run notebook cell) returns the same string object instead of formatting it again.
+@functools.lru_cache(maxsize=16)
+def _format_static_prefix(
+    bad_score: Any, bad_dialogue: str,
+    average_score: Any, average_dialogue: str,
+    good_score: Any, good_dialogue: str,
+) -> str:
+    return _STATIC_PROMPT_TEMPLATE.format(
+        bad_score=bad_score, bad_dialogue=bad_dialogue,
+        average_score=average_score, average_dialogue=average_dialogue,
+        good_score=good_score, good_dialogue=good_dialogue,
+    )
+
+
+def get_user_prompt(static_prefix: str, dialogue_text: str) -> str:
+    """Full prompt for one transcript: the shared prefix, then the transcript."""
+    return "".join((static_prefix, _TRANSCRIPT_HEAD, dialogue_text, _TRANSCRIPT_TAIL))
+
+
+def load_local_scorer(model_name_or_path: str) -> Callable[[str], Tuple[int, float]]:
+    """int8 sequence classifier as a transcript -> (score, confidence) callable.
+
+    Meant for a small model (e.g. DistilBERT) fine-tuned on transcripts the LLM
+    already scored, with the score values as its class labels. Needs torch,
+    transformers and bitsandbytes, imported here rather than at module load.
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer, BitsAndBytesConfig
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name_or_path)
+    model = AutoModelForSequenceClassification.from_pretrained(
+        model_name_or_path, quantization_config=BitsAndBytesConfig(load_in_8bit=True)
+    )
+    model.eval()
+
+    def local_scorer(dialogue_text: str) -> Tuple[int, float]:
+        inputs = tokenizer(dialogue_text, truncation=True, return_tensors="pt").to(model.device)
+        with torch.no_grad():
+            confidence, label = model(**inputs).logits.softmax(-1)[0].max(-1)
+        return int(model.config.id2label[int(label)]), float(confidence)
+
+    return local_scorer
+
+
+def pretokenize(tokenizer: Any, static_prefix: str, dialogue_data: Sequence[str]) -> Tuple[List[int], List[List[int]]]:
+    """Token ids of the shared prefix, and of each transcript with its surrounding block.
+
+    For backends that take token ids (e.g. vLLM's `prompt_token_ids=prefix_ids + ids[i]`),
+    so a run tokenizes every transcript once, in one batched call to a Hugging
+    Face `tokenizer`, instead of on every request.
+    """
+    prefix_ids, head_ids, tail_ids = tokenizer(
+        [static_prefix, _TRANSCRIPT_HEAD, _TRANSCRIPT_TAIL], add_special_tokens=False
+    ).input_ids
+    dialogue_ids = tokenizer(list(dialogue_data), add_special_tokens=False).input_ids
+    return prefix_ids, [head_ids + ids + tail_ids for ids in dialogue_ids]
+
+
+def _response_text(response: Any) -> str:
+    """Text of an LLM response: a str as is, decoded bytes, or an SDK response's `.text`."""
+    if isinstance(response, str):
+        return response
+    if isinstance(response, (bytes, bytearray)):
+        return response.decode('utf-8')
+    return response.text
+
+
+def parse_score(response: Any) -> Optional[int]:
+    """The overall score from a response's last <score>N</score> tag (str or bytes), or None."""
+    scores = parse_scores(response)
+    return scores[-1] if scores else None
+
+
+async def read_until_score(chunks: AsyncIterator[str], expected: int = 1) -> str:
+    """Text of a streamed response up to its `expected`-th </score> tag; the stream is closed there.
+
+    `chunks` yields the text pieces, e.g.
+    `(c.text async for c in await client.aio.models.generate_content_stream(...))`.
+    Whatever the model would write after the last score is never generated.
+    Only safe when the prompt makes the model write exactly `expected` tags:
+    parse_score reads the last tag, and a score quoted in the reasoning would
+    otherwise end the stream early.
+    """
+    buffer = ""
+    found = 0
+    async for piece in chunks:
+        # Rescan the last few characters too, in case a tag is split across pieces
+        start = max(0, len(buffer) - len(_SCORE_CLOSE) + 1)
+        buffer += piece
+        found += buffer.count(_SCORE_CLOSE, start)
+        if found >= expected:
+            break
+    aclose = getattr(chunks, "aclose", None)
+    if aclose is not None:
+        await aclose()
+    return buffer
+
+
+async def score_one(
+    static_prefix: str,
+    dialogue_text: str,
+    generate: Callable[[str], Any],
+    sem: asyncio.Semaphore,
+    stop_at_score: bool = False,
+) -> str:
+    """Send the prompt for one transcript once a request slot is free; returns the response text.
+
+    A streamed response (an async iterator of text pieces) is read to the end,
+    or with `stop_at_score` only up to its first </score> tag (see read_until_score).
+    """
+    async with sem:
+        response = generate(get_user_prompt(static_prefix, dialogue_text))
+        if inspect.isawaitable(response):
+            response = await response
+        if not hasattr(response, "__aiter__"):
+            return _response_text(response)
+        if stop_at_score:
+            return await read_until_score(response)
+        return "".join([piece async for piece in response])
+
+
+async def score_all(
+    static_prefix: str,
+    dialogue_data: Sequence[str],
+    generate: Callable[[str], Any],
+    max_in_flight: int = MAX_IN_FLIGHT,
+    response_cache: Optional[ResponseCache] = None,
+    local_scorer: Optional[Callable[[str], Tuple[int, float]]] = None,
+    min_confidence: float = LOCAL_MIN_CONFIDENCE,
+    stop_at_score: bool = False,
+) -> List[Optional[int]]:
+    """Scores for every transcript, in order, with up to max_in_flight LLM requests at a time.
+
+    `generate` is the async LLM call, e.g.
+    `lambda p: client.aio.models.generate_content(model=MODEL, contents=p)`;
+    it may return the text itself or a response object with `.text`, or be
+    streamed: an async generator (or a coroutine returning an async iterator)
+    of text pieces. Streams are read to the end, so the score is the last tag
+    either way; pass `stop_at_score=True` to close them at the first </score>
+    instead, when the prompt has the model write no other tag.
+    Transcripts are sent in normalize_dialogue form (NFC, \\n line ends,
+    single spaces). Each distinct transcript is sent once; repeats within the
+    batch and ones already in `response_cache` reuse the stored text. Pass
+    `ResponseCache(path=...)` to keep responses across runs. With a
+    `local_scorer` (see load_local_scorer), transcripts it scores with at least
+    `min_confidence` take its score without an LLM call. Every slot holds an
+    int score, or None where the response had no <score> tag. If a request
+    fails, the other responses are still cached before its error is raised.
+    """
+    if response_cache is None:
+        response_cache = _RESPONSE_CACHES.setdefault(static_prefix, ResponseCache(semantic=False))
+    # Same key as the cache, so transcripts it would treat as one are sent once
+    unique, order = dedupe_dialogues(map(normalize_dialogue, dialogue_data), key=dialogue_key)
+    texts, misses = response_cache.split_batch(unique)
+    scores: Dict[int, Optional[int]] = {pos: parse_score(text) for pos, text in texts.items()}
+    if local_scorer is not None:
+        remote = []
+        for pos in misses:
+            score, confidence = local_scorer(unique[pos])
+            if confidence >= min_confidence:
+                scores[pos] = score
+            else:
+                remote.append(pos)
+        misses = remote
+    sem = asyncio.Semaphore(max_in_flight)
+
+    async def fetch(pos: int) -> None:
+        text = await score_one(static_prefix, unique[pos], generate, sem, stop_at_score)
+        # Cached as soon as it arrives, so a failed request elsewhere in the
+        # batch does not lose the responses already paid for
+        response_cache.store(unique[pos], text)
+        scores[pos] = parse_score(text)
+
+    # Every request runs to completion before the first failure is raised
+    outcomes = await asyncio.gather(*(fetch(pos) for pos in misses), return_exceptions=True)
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            raise outcome
+    return expand_results([scores[pos] for pos in range(len(unique))], order)